@@ -0,0 +1,288 @@
+##
+ # Step many games of Alien Shower in lockstep with NumPy.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import time
+import random
+import argparse
+
+import numpy as np
+
+import alien_shower
+
+# ship states
+INACTIVE = 0
+ACTIVE = 1
+WRACKED = 2
+SHIP_STATES = ("inactive", "active", "wracked")
+
+# action kinds, activate takes the ship as value (-1 for the last one as with key 0)
+WAIT = 0
+ACTIVATE = 1
+LEFT = 2
+RIGHT = 3
+SHOOT = 4
+
+# the feedback of update_state by code, NONE keeps the feedback of the previous step
+FEEDBACK = (
+	" " * 20 + "\n" + " " * 20,
+	"no ship activate yet" + "\n" + " " * 20,
+	"ship awaits commands" + "\n" + " " * 20,
+	"ship activated      " + "\n" + " " * 20,
+	"ship life expired   \nhit return to retry ",
+	"ship wracked        " + "\n" + " " * 20,
+	"alien destroyed     " + "\n" + " " * 20,
+	"missed shot          \nhit return to retry ",
+	"missing defence      \nhit return to retry ",
+	"all aliens destroyed\nhit return for more ",
+)
+NONE, NO_SHIP, AWAITS, ACTIVATED, LIFE_EXPIRED, WRACKED_SHIP, DESTROYED, MISSED_SHOT, MISSING_DEFENCE, WON = range(len(FEEDBACK))
+
+# the counters of final_stats in the order of new_final_stats
+FINAL_STATS = tuple(alien_shower.new_final_stats())
+ALIENS_DESTROYED, MOVES_MADE, MISSED_DEFENCE, MISSED_SHOTS, LIFETIME_EXPIRED = range(len(FINAL_STATS))
+
+class BatchGame:
+	"""Rounds of many games with the same rules as arrays, one row per game, stepped together by step() following
+	update_state. Shots are kept in unordered slots, one row per slot (the older of two shots is the one further up).
+	Games that are done keep their state until reset() starts a new round for them, stats and final stats are kept
+	across rounds.
+	"""
+
+	def __init__(self, num_games, num_ships=5, sky_height=4, num_missiles=2, seed=None):
+		self.num_games = num_games
+		self.num_ships = num_ships
+		self.sky_height = alien_shower.winnable_sky_height(num_ships, sky_height, num_missiles)
+		self.num_missiles = num_missiles
+		self.rng = np.random.default_rng(seed)
+		# a shot lives for at most sky_height + 2 steps and one is fired per step at most
+		num_slots = min(num_ships*num_missiles, self.sky_height + 2)
+		self.ships = np.zeros((num_games, num_ships), np.int8)
+		self.ship_active = np.zeros(num_games, bool)
+		self.pos = np.zeros(num_games, np.int16)
+		self.base = np.zeros(num_games, np.int16)
+		self.lifetime = np.zeros(num_games, np.int32)
+		self.shots_left = np.zeros(num_games, np.int32)
+		self.enemy_active = np.zeros(num_games, bool)
+		self.enemy_x = np.zeros(num_games, np.int16)
+		self.enemy_y = np.zeros(num_games, np.int16)
+		self.shot_active = np.zeros((num_slots, num_games), bool)
+		self.shot_x = np.zeros((num_slots, num_games), np.int16)
+		self.shot_y = np.zeros((num_slots, num_games), np.int16)
+		# the alien queue, the next alien at remaining - 1
+		self.queue = np.zeros((num_games, num_ships*num_missiles), np.int16)
+		self.remaining = np.zeros(num_games, np.int32)
+		self.feedback = np.zeros(num_games, np.int8)
+		self.done = np.zeros(num_games, bool)
+		self.wins = np.zeros(num_games, np.int64)
+		self.losses = np.zeros(num_games, np.int64)
+		self.destroyed = np.zeros(num_games, np.int64)
+		# per counter of final_stats the achieved and the possible count by game
+		self.final_stats = np.zeros((len(FINAL_STATS), 2, num_games), np.int64)
+		self.reset()
+
+	def reset(self, games=None, queues=None):
+		# start new rounds for the games given as mask or indices (default all), with shuffled or the given queues
+		games = np.arange(self.num_games) if games is None else np.flatnonzero(games) if np.asarray(games).dtype == bool else np.asarray(games)
+		if queues is None:
+			fleet = np.tile(np.arange(self.num_ships, dtype=np.int16), (len(games), self.num_missiles))
+			queues = self.rng.permuted(fleet, axis=1)
+		self.queue[games] = queues
+		self.remaining[games] = self.queue.shape[1]
+		self.ships[games] = INACTIVE
+		self.ship_active[games] = False
+		self.enemy_active[games] = False
+		self.shot_active[:, games] = False
+		self.destroyed[games] = 0
+		self.feedback[games] = NONE
+		self.done[games] = False
+
+	def legal(self):
+		# the legal actions as masks: (games, kinds) for WAIT, ACTIVATE, LEFT, RIGHT, SHOOT and (games, ships) to activate
+		activate = (self.ships == INACTIVE) & ~self.ship_active[:, None]
+		kinds = np.empty((self.num_games, 5), bool)
+		kinds[:, WAIT] = True
+		kinds[:, ACTIVATE] = activate.any(axis=1)
+		kinds[:, LEFT] = self.ship_active & (self.pos > 0)
+		kinds[:, RIGHT] = self.ship_active & (self.pos < self.num_ships - 1)
+		kinds[:, SHOOT] = self.ship_active & (self.shots_left > 0)
+		return kinds, activate
+
+	def random_actions(self, rng=None, wait=1):
+		# uniformly random legal actions (each activation counts as one), waiting with weight wait
+		rng = rng or self.rng
+		kinds, activate = self.legal()
+		weights = np.concatenate([np.full((self.num_games, 1), wait, float), activate, kinds[:, LEFT:]], axis=1)
+		cumulative = weights.cumsum(axis=1)
+		choice = (cumulative < rng.random(self.num_games)[:, None] * cumulative[:, -1:]).sum(axis=1)
+		action = np.where(choice == 0, WAIT, np.where(choice <= self.num_ships, ACTIVATE, choice - self.num_ships + LEFT - 1))
+		return action.astype(np.int8), (choice - 1).astype(np.int32)
+
+	def step(self, action, value=None):
+		# one step of all games that are not done, action holds the kinds and value the ships to activate
+		num_ships = self.num_ships
+		final_stats = self.final_stats
+		action = np.where(self.done, -1, action)
+		# act
+		games = np.flatnonzero(action == WAIT)
+		self.feedback[games] = np.where(self.ship_active[games], AWAITS, NO_SHIP)
+		games = np.flatnonzero(action == ACTIVATE)
+		if len(games):
+			ship = value[games]
+			ship = np.where(ship >= 0, ship, num_ships - 1)
+			self.ships[games, ship] = ACTIVE
+			self.ship_active[games] = True
+			self.pos[games] = ship
+			self.base[games] = ship
+			self.lifetime[games] = (num_ships*self.num_missiles)//2
+			self.shots_left[games] = self.num_missiles
+			self.feedback[games] = ACTIVATED
+			final_stats[LIFETIME_EXPIRED, 1, games] += 1
+			final_stats[MOVES_MADE, 1, games] += (num_ships*self.num_missiles)//2
+		games = np.flatnonzero((action == LEFT) | (action == RIGHT))
+		if len(games):
+			self.pos[games] += np.where(action[games] == LEFT, -1, 1)
+			self.lifetime[games] -= 1
+			final_stats[MOVES_MADE, 0, games] += 1
+		games = np.flatnonzero(action == SHOOT)
+		if len(games):
+			slot = self.shot_active[:, games].argmin(axis=0)
+			self.shot_active[slot, games] = True
+			self.shot_x[slot, games] = self.pos[games]
+			self.shot_y[slot, games] = self.sky_height
+			self.shots_left[games] -= 1
+			final_stats[MISSED_SHOTS, 1, games] += 1
+		running = action >= 0
+		# check ship lifetime
+		games = np.flatnonzero(running & self.ship_active & ((self.lifetime <= 0) | (self.shots_left <= 0)))
+		if len(games):
+			self.ships[games, self.base[games]] = WRACKED
+			self.ship_active[games] = False
+			expired = self.shots_left[games] > 0
+			self.feedback[games[~expired]] = WRACKED_SHIP
+			games = games[expired]
+			self.lose(games, LIFE_EXPIRED)
+			final_stats[LIFETIME_EXPIRED, 0, games] += 1
+			running[games] = False
+		# move shots, a shot leaving the sky is always the oldest one, so no other shot is checked before the loss
+		games = np.flatnonzero(running & (self.shot_active & (self.shot_y < 0)).any(axis=0))
+		if len(games):
+			self.lose(games, MISSED_SHOT)
+			final_stats[MISSED_SHOTS, 0, games] += 1
+			running[games] = False
+		shot_active = self.shot_active & running
+		# the oldest shot in the cell of the alien or right below it destroys it
+		hit = shot_active & self.enemy_active & (self.shot_x == self.enemy_x) & (np.subtract(self.shot_y, self.enemy_y).view(np.uint16) <= 1)
+		games = np.flatnonzero(hit.any(axis=0))
+		if len(games):
+			slot = np.where(hit[:, games], self.shot_y[:, games], np.iinfo(np.int16).max).argmin(axis=0)
+			self.shot_active[slot, games] = False
+			shot_active[slot, games] = False
+			self.enemy_active[games] = False
+			self.destroyed[games] += 1
+			self.feedback[games] = DESTROYED
+			final_stats[ALIENS_DESTROYED, 0, games] += 1
+		self.shot_y -= shot_active.view(np.int8)
+		# move enemy
+		descending = running & self.enemy_active
+		self.enemy_y += descending
+		games = np.flatnonzero(descending & (self.enemy_y >= self.sky_height))
+		if len(games):
+			self.lose(games, MISSING_DEFENCE)
+			final_stats[MISSED_DEFENCE, 0, games] += 1
+		waiting = running & ~self.enemy_active
+		won = np.flatnonzero(waiting & (self.remaining == 0))
+		games = np.flatnonzero(waiting & (self.remaining > 0))
+		if len(games):
+			self.remaining[games] -= 1
+			self.enemy_x[games] = self.queue[games, self.remaining[games]]
+			self.enemy_y[games] = 0
+			self.enemy_active[games] = True
+			final_stats[ALIENS_DESTROYED, 1, games] += 1
+		if len(won):
+			self.wins[won] += 1
+			final_stats[MISSED_DEFENCE, 1, won] += 1
+			self.feedback[won] = WON
+			self.done[won] = True
+		return self.done
+
+	def lose(self, games, feedback):
+		self.losses[games] += 1
+		self.final_stats[MISSED_DEFENCE, 1, games] += 1
+		self.feedback[games] = feedback
+		self.done[games] = True
+
+	def game(self, i):
+		# game i as used by update_state: (ships, active_ship, active_enemy, active_shots, enemy_appearance)
+		ships = [SHIP_STATES[state] for state in self.ships[i]]
+		active_ship = {"pos": int(self.pos[i]), "lifetime": int(self.lifetime[i]), "base": int(self.base[i]), "shots": int(self.shots_left[i])} if self.ship_active[i] else {}
+		active_enemy = {"pos_x": int(self.enemy_x[i]), "pos_y": int(self.enemy_y[i])} if self.enemy_active[i] else {}
+		slots = np.flatnonzero(self.shot_active[:, i])
+		active_shots = [{"pos_x": int(self.shot_x[slot, i]), "pos_y": int(self.shot_y[slot, i])} for slot in slots[np.argsort(self.shot_y[slots, i])]]
+		return ships, active_ship, active_enemy, active_shots, self.queue[i, :self.remaining[i]].tolist()
+
+	def stats(self, i):
+		# the stats and final stats of game i as dicts
+		stats = {"wins": int(self.wins[i]), "losses": int(self.losses[i]), "destroyed": int(self.destroyed[i])}
+		final_stats = {key: self.final_stats[k, :, i].tolist() for k, key in enumerate(FINAL_STATS)}
+		return stats, final_stats
+
+def throughput(num_games, steps, num_ships, sky_height, num_missiles, seed=0):
+	# game steps per second of the batch and of update_state called in a loop, both played by random players
+	# (only the time spent in the rules counts)
+	batch = BatchGame(num_games, num_ships, sky_height, num_missiles, seed)
+	rng = np.random.default_rng(seed)
+	elapsed = 0
+	for _ in range(steps):
+		action, value = batch.random_actions(rng)
+		start = time.perf_counter()
+		batch.step(action, value)
+		elapsed += time.perf_counter() - start
+		if batch.done.any():
+			batch.reset(batch.done)
+	batch_rate = num_games * steps / elapsed
+	engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed)
+	player = random.Random(seed)
+	scalar_steps = max(1000, min(num_games * steps, 100000))
+	elapsed = 0
+	for _ in range(scalar_steps):
+		if engine.done:
+			engine.reset()
+		action = player.choice(engine.legal_actions() + [()])
+		start = time.perf_counter()
+		engine.done, engine.feedback = alien_shower.update_state(engine.active_ship, engine.active_enemy, engine.active_shots, engine.ships,
+			engine.enemy_appearance, engine.sky_height, num_missiles, engine.stats, action, engine.final_stats, engine.feedback)
+		elapsed += time.perf_counter() - start
+	scalar_rate = scalar_steps / elapsed
+	return batch_rate, scalar_rate
+
+def main():
+	parser = argparse.ArgumentParser(description="Measure the throughput of stepping many games of Alien Shower in lockstep.")
+	parser.add_argument("--games", type=int, default=10000, help="the number of games in the batch")
+	parser.add_argument("--steps", type=int, default=200, help="the number of steps")
+	parser.add_argument("--ships", type=int, default=5, help="the number of ships")
+	parser.add_argument("--sky", type=int, default=4, help="the sky height")
+	parser.add_argument("--missiles", type=int, default=2, help="the number of missiles of each ship")
+	parser.add_argument("--seed", type=int, default=0, help="the seed of the games and the random players")
+	args = parser.parse_args()
+	batch_rate, scalar_rate = throughput(args.games, args.steps, args.ships, args.sky, args.missiles, args.seed)
+	print(f"batch: {batch_rate:12.0f} steps/s")
+	print(f"scalar: {scalar_rate:11.0f} steps/s  ({batch_rate / scalar_rate:.1f}x)")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,243 @@
+##
+ # Benchmarks for the per-frame hot path of Alien Shower.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+
+import alien_shower
+
+# custom boards beyond the predefined difficulties as (num_ships, sky_height, num_missiles)
+LARGE_BOARDS = {
+	"tall": (10, 50, 3),
+	"huge": (10, 200, 5),
+	"wide": (300, 4, 2), # the sky height is adjusted to 299
+}
+
+# the viewport of a terminal with 80 columns and 45 rows as used by game()
+VIEW = (10, 30)
+
+# the functions called per frame by the game loop
+FRAME = ("update_state", "update_world", "draw")
+
+class FakeScreen:
+	"""Stands in for a curses window, counting the calls and characters written."""
+
+	def __init__(self, height=1000, width=1000):
+		self.height = height
+		self.width = width
+		self.calls = 0
+		self.chars = 0
+
+	def addstr(self, *args):
+		self.calls += 1
+		self.chars += len(args[2] if len(args) > 2 and isinstance(args[2], str) else args[0])
+
+	def getmaxyx(self):
+		return self.height, self.width
+
+	def getch(self):
+		return -1
+
+	def clear(self):
+		pass
+
+	def refresh(self):
+		pass
+
+	def timeout(self, delay):
+		pass
+
+	def nodelay(self, flag):
+		pass
+
+def percentile(ordered, fraction):
+	return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(timings):
+	# timings in nanoseconds, summary in microseconds
+	ordered = sorted(timings)
+	return {
+		"calls": len(ordered),
+		"mean_us": sum(ordered) / len(ordered) / 1000,
+		"p50_us": percentile(ordered, 0.5) / 1000,
+		"p90_us": percentile(ordered, 0.9) / 1000,
+		"p99_us": percentile(ordered, 0.99) / 1000,
+		"max_us": ordered[-1] / 1000,
+	}
+
+class Session:
+	"""A game driven by a random player, one game step per frame."""
+
+	def __init__(self, num_ships, sky_height, num_missiles, seed):
+		self.engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=seed)
+		self.rng = random.Random(seed)
+		self.world = alien_shower.init_game(num_ships, self.engine.sky_height, num_missiles, view=VIEW)[2]
+		self.renderer = alien_shower.WorldRenderer()
+		self.screen = FakeScreen()
+		self.frame = 0
+
+	def update_state(self):
+		engine = self.engine
+		if engine.done:
+			engine.reset()
+		# wait now and then like a player does
+		action = self.rng.choice(engine.legal_actions() + [()])
+		wins = engine.stats["wins"]
+		engine.done, engine.feedback = alien_shower.update_state(engine.active_ship, engine.active_enemy, engine.active_shots, engine.ships,
+			engine.enemy_appearance, engine.sky_height, engine.num_missiles, engine.stats, action, engine.final_stats, engine.feedback)
+		engine.won = engine.stats["wins"] > wins
+		self.action = action
+
+	def update_world(self):
+		engine = self.engine
+		self.frame += 1
+		alien_shower.update_world(self.world, engine.sky_height, engine.active_ship, engine.active_enemy, engine.active_shots, engine.ships,
+			engine.enemy_appearance, engine.stats, 5 - self.frame % 5, engine.feedback, self.action[2] if self.action else "wait  ", VIEW)
+
+	def draw(self):
+		self.renderer.draw(self.screen, self.world)
+
+	def draw_world(self):
+		alien_shower.draw_world(self.screen, self.world)
+
+def measure(num_ships, sky_height, num_missiles, frames, seed=0):
+	session = Session(num_ships, sky_height, num_missiles, seed)
+	clock = time.perf_counter_ns
+	timings = {name: [] for name in FRAME + ("draw_world", "addstr_format", "game_snapshot")}
+	frame_times = []
+	for _ in range(frames):
+		frame_time = 0
+		for name in FRAME:
+			call = getattr(session, name)
+			start = clock()
+			call()
+			elapsed = clock() - start
+			timings[name].append(elapsed)
+			frame_time += elapsed
+		frame_times.append(frame_time)
+		# the full redraw for comparison with the renderer
+		start = clock()
+		session.draw_world()
+		timings["draw_world"].append(clock() - start)
+	# formatting of the busiest row and the overview screen
+	row = session.world[-4]
+	for _ in range(frames):
+		start = clock()
+		alien_shower.addstr_format(session.screen, 0, 0, row[0], *row[1])
+		timings["addstr_format"].append(clock() - start)
+	ships = ["inactive"] * num_ships
+	for _ in range(max(1, frames // 10)):
+		start = clock()
+		alien_shower.game_snapshot(num_ships, session.engine.sky_height, num_missiles, ships, VIEW)
+		timings["game_snapshot"].append(clock() - start)
+	result = {name: summarize(values) for name, values in timings.items()}
+	result["frame"] = summarize(frame_times)
+	result["frame"]["fps"] = 1e9 * len(frame_times) / sum(frame_times)
+	result["frame"].update(allocations(num_ships, sky_height, num_missiles, min(frames, 1000), seed))
+	return result
+
+def allocations(num_ships, sky_height, num_missiles, frames, seed=0):
+	# memory allocated within a frame (peak above the start) and kept after it
+	session = Session(num_ships, sky_height, num_missiles, seed)
+	calls = [getattr(session, name) for name in FRAME]
+	# the peak of each frame is traced from its start (resetting the peak of a running trace needs Python 3.9)
+	peak = 0
+	for _ in range(frames):
+		tracemalloc.start()
+		try:
+			for call in calls:
+				call()
+			peak += tracemalloc.get_traced_memory()[1]
+		finally:
+			tracemalloc.stop()
+	# the memory kept is the growth over as many frames more, traced throughout to count what they free as well
+	tracemalloc.start()
+	try:
+		before = tracemalloc.get_traced_memory()[0]
+		for _ in range(frames):
+			for call in calls:
+				call()
+		kept = tracemalloc.get_traced_memory()[0] - before
+	finally:
+		tracemalloc.stop()
+	return {"alloc_bytes": peak / frames, "kept_bytes": kept / frames}
+
+def configurations(names=None):
+	configs = {name: difficulty[:3] for name, difficulty in alien_shower.DIFFICULTIES.items()}
+	configs.update(LARGE_BOARDS)
+	if names:
+		configs = {name: configs[name] for name in names}
+	return configs
+
+def compare(results, baseline, threshold):
+	# print the change per configuration and function, returns the regressions beyond the threshold
+	regressions = []
+	for config, functions in results["results"].items():
+		for name, summary in functions.items():
+			old = baseline["results"].get(config, {}).get(name)
+			if not old:
+				continue
+			ratio = summary["p50_us"] / old["p50_us"] if old["p50_us"] else 1
+			mark = ""
+			if ratio > 1 + threshold:
+				mark = "  <- slower"
+				regressions.append((config, name, ratio))
+			print(f"{config:10} {name:14} {old['p50_us']:10.2f} -> {summary['p50_us']:10.2f} us  ({ratio:5.2f}x){mark}")
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark the per-frame hot path of Alien Shower.")
+	parser.add_argument("--frames", type=int, default=5000, help="the number of frames per configuration")
+	parser.add_argument("--config", nargs="*", choices=list(configurations()), help="the configurations to run (default: all)")
+	parser.add_argument("--seed", type=int, default=0, help="the seed of the games and the random player")
+	parser.add_argument("--output", help="save the results as json to this file")
+	parser.add_argument("--compare", help="compare to the results saved in this file")
+	parser.add_argument("--threshold", type=float, default=0.1, help="the relative slowdown of the median reported as regression")
+	args = parser.parse_args()
+	results = {
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"frames": args.frames,
+		"results": {},
+	}
+	for name, (num_ships, sky_height, num_missiles) in configurations(args.config).items():
+		result = measure(num_ships, sky_height, num_missiles, args.frames, args.seed)
+		results["results"][name] = result
+		frame = result["frame"]
+		print(f"{name:10} {frame['fps']:10.0f} fps  p50 {frame['p50_us']:8.2f} us  p99 {frame['p99_us']:8.2f} us  {frame['alloc_bytes']:8.0f} B allocated per frame")
+		for function in FRAME + ("draw_world", "addstr_format", "game_snapshot"):
+			summary = result[function]
+			print(f"  {function:14} p50 {summary['p50_us']:8.2f} us  p90 {summary['p90_us']:8.2f} us  p99 {summary['p99_us']:8.2f} us")
+	if args.output:
+		with open(args.output, "w") as results_file:
+			json.dump(results, results_file, indent=1)
+	if args.compare:
+		with open(args.compare) as baseline_file:
+			baseline = json.load(baseline_file)
+		if compare(results, baseline, args.threshold):
+			sys.exit(1)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,200 @@
+##
+ # Let a bot play the live game of Alien Shower from a worker process.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# the game writes the state of each tick as snapshot into shared memory behind a sequence number (odd while it
+# writes) and wakes the worker with an empty message on a pipe, the worker answers with the tick and the action
+# packed into a few bytes, nothing is pickled per tick
+
+import time
+import struct
+import argparse
+import multiprocessing
+
+import alien_shower
+import alien_solver
+import alien_tournament
+
+# sequence number (twice the tick), round
+STATE_HEADER = struct.Struct("<II")
+# tick, action kind, value (the ship to activate, as wide as the number of ships may be)
+ANSWER = struct.Struct("<Ibi")
+
+# action kinds
+WAIT = 0
+ACTIVATE = 1
+LEFT = 2
+RIGHT = 3
+SHOOT = 4
+
+def encode_action(action):
+	if not action:
+		return WAIT, 0
+	if action[0] == "activate":
+		return ACTIVATE, action[1]
+	if action[0] == "move":
+		return LEFT if action[1] == "left" else RIGHT, 0
+	return SHOOT, 0
+
+def decode_action(kind, value):
+	# the action as process_input and legal_actions give it
+	if kind == ACTIVATE:
+		return alien_solver.activate(value)
+	return {LEFT: alien_solver.LEFT, RIGHT: alien_solver.RIGHT, SHOOT: alien_solver.SHOOT}.get(kind, alien_solver.WAIT)
+
+def state_size(num_ships, num_missiles):
+	# the largest snapshot of a round without random number generator (there are never more aliens queued or shots
+	# in flight than missiles)
+	return STATE_HEADER.size + alien_shower.SNAPSHOT_HEADER.size + num_ships + 12 * num_ships * num_missiles
+
+def read_state(view):
+	# the sequence number, round and snapshot of a complete write
+	while True:
+		seq, round_number = STATE_HEADER.unpack_from(view)
+		if seq % 2:
+			continue
+		data = view.tobytes()
+		if STATE_HEADER.unpack_from(view)[0] == seq:
+			return seq, round_number, data
+
+def serve(bot_name, buffer, conn, seed=None):
+	# the worker: play each tick it is woken for, skipping the ticks it fell behind on
+	bot = alien_tournament.load_bot(bot_name)(seed)
+	view = memoryview(buffer).cast("B")
+	engine = alien_shower.GameEngine(2, 1, 1)
+	last_round = None
+	while True:
+		try:
+			conn.recv_bytes()
+			while conn.poll():
+				conn.recv_bytes()
+		except (EOFError, OSError):
+			return
+		seq, round_number, data = read_state(view)
+		engine.restore(data, STATE_HEADER.size)
+		if round_number != last_round:
+			bot.reset(engine)
+			last_round = round_number
+		kind, value = encode_action(bot.act(engine))
+		try:
+			conn.send_bytes(ANSWER.pack(seq // 2, kind, value))
+		except OSError:
+			return
+
+class BotPlayer:
+	"""Runs a bot (as played by alien_tournament) in a worker process and takes its answer for the current tick.
+
+	The game never waits for the bot: an answer arriving after the step of its tick is dropped and the ship waits,
+	as does a bot that chose an action the rules do not allow. A worker that died is told by alive().
+	"""
+
+	def __init__(self, bot_name, num_ships, num_missiles, seed=None):
+		self.buffer = multiprocessing.RawArray("B", state_size(num_ships, num_missiles))
+		self.view = memoryview(self.buffer).cast("B")
+		self.conn, child = multiprocessing.Pipe()
+		self.process = multiprocessing.Process(target=serve, args=(bot_name, self.buffer, child, seed), daemon=True)
+		self.process.start()
+		child.close()
+		self.tick = 0
+		self.round = 0
+		self.action = None
+		self.dead = False
+
+	def publish(self, ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, timeleft, sky_height, num_missiles, new_round=False):
+		# start the next tick with the state its action applies to
+		self.tick += 1
+		if new_round:
+			self.round += 1
+		self.action = None
+		data = alien_shower.snapshot(ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, timeleft, sky_height, num_missiles)
+		view = self.view
+		struct.pack_into("<I", view, 0, 2 * self.tick - 1)
+		view[STATE_HEADER.size:STATE_HEADER.size + len(data)] = data
+		STATE_HEADER.pack_into(view, 0, 2 * self.tick, self.round)
+		try:
+			self.conn.send_bytes(b"")
+		except OSError:
+			pass
+
+	def poll(self, active_ship, ships):
+		# the action of the bot for the current tick, None until it answered
+		try:
+			while self.conn.poll():
+				tick, kind, value = ANSWER.unpack(self.conn.recv_bytes())
+				if tick == self.tick:
+					action = decode_action(kind, value)
+					self.action = action if not action or action in alien_shower.legal_actions(active_ship, ships) else ()
+		except (EOFError, OSError):
+			# the worker closed its end of the pipe
+			self.dead = True
+		return self.action
+
+	def alive(self):
+		# whether the worker can still answer, after poll() took the answers it left
+		if not self.dead and not self.process.is_alive():
+			self.dead = True
+		return not self.dead
+
+	def close(self):
+		self.conn.close()
+		self.view.release()
+		self.process.join(1)
+		if self.process.is_alive():
+			self.process.terminate()
+
+def benchmark(bot_name, ticks, num_ships=10, sky_height=10, num_missiles=3, seed=0):
+	# the time from publishing a state to the answer of the bot per tick, stepping a headless game by the answers
+	engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=seed)
+	player = BotPlayer(bot_name, num_ships, num_missiles, seed)
+	timings = []
+	new_round = True
+	try:
+		for _ in range(ticks):
+			if engine.done:
+				engine.reset()
+				new_round = True
+			start = time.perf_counter()
+			player.publish(engine.ships, engine.enemy_appearance, engine.active_ship, engine.active_enemy, engine.active_shots,
+				engine.stats, engine.final_stats, 0, engine.sky_height, engine.num_missiles, new_round)
+			while player.poll(engine.active_ship, engine.ships) is None:
+				if not player.alive():
+					player.process.join(1)
+					raise RuntimeError(f"the worker of bot {bot_name} died at tick {player.tick} (exit code {player.process.exitcode})")
+				player.conn.poll(1)
+			timings.append(time.perf_counter() - start)
+			engine.step(player.action)
+			new_round = False
+	finally:
+		player.close()
+	timings.sort()
+	return engine.stats, timings
+
+def main():
+	parser = argparse.ArgumentParser(description="Time the round trip of the game state to a bot in a worker process and its answer.")
+	parser.add_argument("--bot", default="greedy", help=f"the bot, one of {', '.join(alien_tournament.BOTS)} or module:class")
+	parser.add_argument("--ticks", type=int, default=10000, help="the ticks to time")
+	args = parser.parse_args()
+	try:
+		stats, timings = benchmark(args.bot, args.ticks)
+	except RuntimeError as error:
+		parser.exit(1, f"{parser.prog}: error: {error}\n")
+	print(f"{len(timings)} ticks, {stats['wins']} rounds won, {stats['losses']} lost")
+	print(f"round trip: p50 {timings[len(timings) // 2] * 1e6:.0f}us, p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f}us, max {timings[-1] * 1e6:.0f}us")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,313 @@
+##
+ # Broadcast a running game of Alien Shower to spectators as a stream of frame deltas.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import os
+import sys
+import stat
+import socket
+import argparse
+import collections
+
+import alien_shower
+from alien_render import sgr
+
+# cursor moves cost about as much as rewriting this many unchanged cells between two changed runs of a row
+MERGE_GAP = 6
+# send a keyframe at least every so many frames so that a stream joined anywhere (e.g. through a pipe) syncs
+KEYFRAME_INTERVAL = 100
+# the bytes a spectator may fall behind before it skips ahead to the next keyframe
+MAX_BACKLOG = 1 << 16
+
+class CellScreen:
+	"""Stands in for a curses window, keeping the character and attribute of each cell to compare frames by."""
+	__slots__ = ("chars", "attrs", "height", "width", "y", "x")
+
+	def __init__(self, height=24, width=80):
+		self.height = height
+		self.width = width
+		self.chars = [[" "] * width for _ in range(height)]
+		self.attrs = [[0] * width for _ in range(height)]
+		self.y = 0
+		self.x = 0
+
+	def addstr(self, y, x=0, text=None, attr=0):
+		# addstr(y, x, text[, attr]) or addstr(text[, attr]) as in curses (text beyond the right edge is cut)
+		if text is None:
+			text = y
+			attr = x
+		else:
+			self.y = y
+			self.x = x
+		for i, line in enumerate(text.split("\n")):
+			if i:
+				# like curses, a newline clears the rest of the line and continues at the start of the next one
+				self.erase_line()
+				self.y += 1
+				self.x = 0
+			if self.y >= self.height:
+				return
+			end = min(self.x + len(line), self.width)
+			self.chars[self.y][self.x:end] = line[:end - self.x]
+			self.attrs[self.y][self.x:end] = [attr] * (end - self.x)
+			self.x = end
+
+	def erase_line(self):
+		if self.y < self.height:
+			self.chars[self.y][self.x:] = " " * (self.width - self.x)
+			self.attrs[self.y][self.x:] = [0] * (self.width - self.x)
+
+	def clear(self):
+		for y in range(self.height):
+			self.chars[y][:] = " " * self.width
+			self.attrs[y][:] = [0] * self.width
+		self.y = self.x = 0
+
+	def getmaxyx(self):
+		return self.height, self.width
+
+	def refresh(self):
+		pass
+
+def encode_run(parts, chars, attrs, start, end, attr):
+	# append the cells of a row from start to end, switching attributes where they change, returns the last attribute
+	for x in range(start, end):
+		if attrs[x] != attr:
+			attr = attrs[x]
+			parts.append(sgr(attr))
+		parts.append(chars[x])
+	return attr
+
+class FrameEncoder:
+	"""Encodes the frames of a CellScreen as ANSI escape sequences, so that any terminal can show them as they are.
+
+	A keyframe rewrites every cell, a delta only the runs of cells that changed since the previous frame.
+	"""
+
+	def __init__(self, screen, keyframe_interval=KEYFRAME_INTERVAL):
+		self.screen = screen
+		self.keyframe_interval = keyframe_interval
+		self.chars = [[None] * screen.width for _ in range(screen.height)]
+		self.attrs = [[None] * screen.width for _ in range(screen.height)]
+		self.frames = 0
+
+	def keyframe(self):
+		screen = self.screen
+		parts = []
+		attr = None
+		for y in range(screen.height):
+			parts.append(f"\x1b[{y + 1};1H")
+			attr = encode_run(parts, screen.chars[y], screen.attrs[y], 0, screen.width, attr)
+		return "".join(parts).encode()
+
+	def delta(self):
+		# the changes since the previous frame (empty if there are none), remembers the current frame as previous
+		screen = self.screen
+		parts = []
+		attr = None
+		for y in range(screen.height):
+			chars = screen.chars[y]
+			attrs = screen.attrs[y]
+			last_chars = self.chars[y]
+			last_attrs = self.attrs[y]
+			if chars == last_chars and attrs == last_attrs:
+				continue
+			x = 0
+			width = screen.width
+			while x < width:
+				if chars[x] == last_chars[x] and attrs[x] == last_attrs[x]:
+					x += 1
+					continue
+				# extend the run over unchanged cells as long as the gap is cheaper than moving the cursor
+				start = end = x
+				gap = 0
+				while x < width and gap <= MERGE_GAP:
+					if chars[x] == last_chars[x] and attrs[x] == last_attrs[x]:
+						gap += 1
+					else:
+						gap = 0
+						end = x + 1
+					x += 1
+				parts.append(f"\x1b[{y + 1};{start + 1}H")
+				attr = encode_run(parts, chars, attrs, start, end, attr)
+			last_chars[:] = chars
+			last_attrs[:] = attrs
+		return "".join(parts).encode()
+
+	def encode(self):
+		# the next frame of the stream, a keyframe at the interval, else a delta
+		self.frames += 1
+		if self.frames % self.keyframe_interval == 0:
+			self.delta()
+			return self.keyframe()
+		return self.delta()
+
+class Spectator:
+	"""A connected socket and the frames not sent to it yet (the first possibly in part)."""
+	__slots__ = ("sock", "frames", "offset", "backlog")
+
+	def __init__(self, sock):
+		self.sock = sock
+		self.frames = collections.deque()
+		self.offset = 0
+		self.backlog = 0
+
+	def queue(self, frame):
+		self.frames.append(frame)
+		self.backlog += len(frame)
+
+	def skip(self, keyframe):
+		# drop the frames not begun yet and continue with the keyframe
+		while len(self.frames) > (1 if self.offset else 0):
+			self.backlog -= len(self.frames.pop())
+		self.queue(keyframe)
+
+	def send(self):
+		# send as much as the socket takes without blocking, returns False once the spectator left
+		frames = self.frames
+		try:
+			while frames:
+				sent = self.sock.send(memoryview(frames[0])[self.offset:])
+				self.offset += sent
+				self.backlog -= sent
+				if self.offset < len(frames[0]):
+					break
+				frames.popleft()
+				self.offset = 0
+		except BlockingIOError:
+			pass
+		except OSError:
+			return False
+		return True
+
+def stale_socket(path):
+	# whether a socket (left by an earlier game) is in the way at path, raises ValueError for anything else there
+	try:
+		mode = os.stat(path).st_mode
+	except FileNotFoundError:
+		return False
+	if not stat.S_ISSOCK(mode):
+		raise ValueError(f"{path} exists and is no socket")
+	return True
+
+class Broadcaster:
+	"""Draws the world of one game onto a CellScreen and fans each encoded frame out to all spectators on a Unix socket.
+
+	Every frame is encoded once, whatever the number of spectators. New spectators start with the whole screen,
+	spectators that cannot keep up skip ahead to a keyframe.
+	"""
+
+	def __init__(self, path, height=24, width=80, keyframe_interval=KEYFRAME_INTERVAL, max_backlog=MAX_BACKLOG):
+		self.path = path
+		self.screen = CellScreen(height, width)
+		self.encoder = FrameEncoder(self.screen, keyframe_interval)
+		self.renderer = alien_shower.WorldRenderer()
+		self.max_backlog = max_backlog
+		self.spectators = []
+		if stale_socket(path):
+			os.unlink(path)
+		self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self.sock.bind(path)
+		self.sock.listen(socket.SOMAXCONN)
+		self.sock.setblocking(False)
+
+	def accept(self):
+		# new spectators start with the current frame
+		keyframe = None
+		while True:
+			try:
+				sock, _ = self.sock.accept()
+			except BlockingIOError:
+				return
+			sock.setblocking(False)
+			if keyframe is None:
+				keyframe = b"\x1b[0m\x1b[2J\x1b[?25l" + self.encoder.keyframe()
+			spectator = Spectator(sock)
+			spectator.queue(keyframe)
+			self.spectators.append(spectator)
+
+	def draw(self, world, color=0):
+		# draw the changed rows of the world and publish the frame
+		self.renderer.draw(self.screen, world, color)
+		self.publish()
+
+	def clear(self):
+		self.screen.clear()
+		self.renderer.invalidate()
+
+	def publish(self):
+		frame = self.encoder.encode()
+		keyframe = None
+		if frame:
+			for spectator in self.spectators:
+				if spectator.backlog + len(frame) > self.max_backlog:
+					if keyframe is None:
+						keyframe = self.encoder.keyframe()
+					spectator.skip(keyframe)
+				else:
+					spectator.queue(frame)
+		self.accept()
+		connected = []
+		for spectator in self.spectators:
+			if spectator.send():
+				connected.append(spectator)
+			else:
+				spectator.sock.close()
+		self.spectators = connected
+
+	def close(self):
+		# hand the frames left to the spectators (waiting at most a second for each) and end the stream
+		for spectator in self.spectators:
+			spectator.sock.settimeout(1)
+			spectator.send()
+			spectator.sock.close()
+		self.spectators = []
+		self.sock.close()
+		try:
+			os.unlink(self.path)
+		except OSError:
+			pass
+
+def watch(path, out=None):
+	# copy the stream of a broadcast to the terminal until the game ends
+	out = out or sys.stdout.buffer
+	sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+	sock.connect(path)
+	out.write(b"\x1b[?1049h")
+	try:
+		while True:
+			data = sock.recv(65536)
+			if not data:
+				break
+			out.write(data)
+			out.flush()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		sock.close()
+		out.write(b"\x1b[0m\x1b[?25h\x1b[?1049l")
+		out.flush()
+
+def main():
+	parser = argparse.ArgumentParser(description="Watch a game of Alien Shower started with --broadcast (or connect with e.g. socat - UNIX-CONNECT:PATH).")
+	parser.add_argument("path", help="the Unix socket the game broadcasts on")
+	args = parser.parse_args()
+	watch(args.path)
+
+if __name__ == "__main__":
+	main()
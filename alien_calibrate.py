@@ -0,0 +1,190 @@
+##
+ # Estimate how hard configurations of Alien Shower are by letting a reference bot play them.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import os
+import json
+import math
+import hashlib
+import inspect
+import argparse
+import concurrent.futures
+
+import alien_shower
+import alien_tournament
+
+# the median and spread of the reaction time of the reference player in seconds
+REACTION_TIME = 0.35
+REACTION_SPREAD = 0.5
+
+DEFAULT_CACHE = os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "alien_shower", "calibration.json")
+
+class ReferenceBot(alien_tournament.GreedyBot):
+	"""Plays greedy, but only if its (log-normal) reaction time fits into the countdown, else the step passes."""
+
+	def __init__(self, seed=None, timeleft=1):
+		super().__init__(seed)
+		self.timeleft = timeleft
+
+	def act(self, engine):
+		if self.rng.lognormvariate(math.log(REACTION_TIME), REACTION_SPREAD) > self.timeleft:
+			return ()
+		return super().act(engine)
+
+def rules_version():
+	# results are only valid for the rules and the bot they were simulated with
+	sources = [alien_shower.update_ship, alien_shower.update_state, alien_shower.init_fleet, alien_tournament.GreedyBot, ReferenceBot]
+	digest = hashlib.sha1("".join(inspect.getsource(source) for source in sources).encode())
+	digest.update(f"{REACTION_TIME} {REACTION_SPREAD}".encode())
+	return digest.hexdigest()[:12]
+
+def normalize(num_ships, sky_height, num_missiles, speed):
+	# adjust sky height as every board is played, so equal games share one key
+	return num_ships, alien_shower.winnable_sky_height(num_ships, sky_height, num_missiles), num_missiles, round(float(speed), 3)
+
+def config_key(config):
+	return ",".join(str(value) for value in config)
+
+def parse_key(key):
+	num_ships, sky_height, num_missiles, speed = key.split(",")
+	return int(num_ships), int(sky_height), int(num_missiles), float(speed)
+
+def simulate(config, seeds):
+	# play one round per seed, runs in a worker process
+	num_ships, sky_height, num_missiles, speed = config
+	rounds = wins = destroyed = 0
+	for seed in seeds:
+		bot = ReferenceBot(seed, speed)
+		engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=seed)
+		bot.reset(engine)
+		while not engine.done:
+			engine.step(bot.act(engine))
+		rounds += 1
+		wins += engine.won
+		destroyed += engine.final_stats["aliens destroyed"][0]
+	return {"rounds": rounds, "wins": wins, "destroyed": destroyed}
+
+class Calibration:
+	"""Simulated results by configuration (ships, sky height, missiles, speed), kept in a json file per rules version."""
+
+	def __init__(self, path=DEFAULT_CACHE):
+		self.path = path
+		self.version = rules_version()
+		self.results = {}
+		try:
+			with open(path) as cache_file:
+				self.results = json.load(cache_file).get(self.version, {})
+		except (OSError, ValueError):
+			pass
+
+	def save(self):
+		# keep the results of other rules versions, replace the file at once to never leave it half written
+		data = {}
+		try:
+			with open(self.path) as cache_file:
+				data = json.load(cache_file)
+		except (OSError, ValueError):
+			pass
+		data[self.version] = self.results
+		os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+		temporary = f"{self.path}.{os.getpid()}"
+		with open(temporary, "w") as cache_file:
+			json.dump(data, cache_file)
+		os.replace(temporary, self.path)
+
+	def get(self, config):
+		return self.results.get(config_key(normalize(*config)))
+
+	def estimate(self, config):
+		# (win rate, average aliens destroyed per round) or None if not simulated yet
+		result = self.get(config)
+		if not result:
+			return None
+		return result["wins"] / result["rounds"], result["destroyed"] / result["rounds"]
+
+	def calibrate(self, configs, rounds, workers=None, chunk_size=50, progress=None):
+		# simulate the configurations until each has at least the given number of rounds (results are cached)
+		configs = sorted({normalize(*config) for config in configs})
+		tasks = []
+		for config in configs:
+			done = (self.get(config) or {"rounds": 0})["rounds"]
+			for start in range(done, rounds, chunk_size):
+				tasks.append((config, range(start, min(start + chunk_size, rounds))))
+		if not tasks:
+			return 0
+		with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+			futures = {pool.submit(simulate, config, seeds): config for config, seeds in tasks}
+			for i, future in enumerate(concurrent.futures.as_completed(futures), 1):
+				config = futures[future]
+				total = self.results.setdefault(config_key(config), {"rounds": 0, "wins": 0, "destroyed": 0})
+				for key, value in future.result().items():
+					total[key] += value
+				if progress:
+					progress(i, len(tasks))
+		self.save()
+		return len(tasks)
+
+	def suggest(self, target, num_ships=None, sky_height=None, num_missiles=None, speed=None):
+		# the simulated configuration with the win rate closest to the target, optionally with some values fixed
+		# (prefers smaller boards and slower speeds on a tie), None if nothing matching was simulated
+		best = None
+		for key, result in self.results.items():
+			config = parse_key(key)
+			if any(value is not None and value != fixed for value, fixed in zip((num_ships, sky_height, num_missiles, speed), config)):
+				continue
+			rank = (abs(result["wins"] / result["rounds"] - target), config[0], config[1], config[2], -config[3])
+			if best is None or rank < best[0]:
+				best = (rank, config)
+		return best[1] if best else None
+
+def grid(ships, skies, missiles, speeds):
+	return [(num_ships, sky_height, num_missiles, speed) for num_ships in ships for sky_height in skies for num_missiles in missiles for speed in speeds]
+
+def main():
+	parser = argparse.ArgumentParser(description="Estimate win rates of Alien Shower configurations with a simulated reference player.")
+	parser.add_argument("--ships", type=int, nargs="+", default=list(range(3, 11)), help="the numbers of ships to simulate")
+	parser.add_argument("--sky", type=int, nargs="+", default=list(range(2, 11)), help="the sky heights to simulate")
+	parser.add_argument("--missiles", type=int, nargs="+", default=[1, 2, 3], help="the numbers of missiles to simulate")
+	parser.add_argument("--speed", type=float, nargs="+", default=[1.0, 0.7, 0.5, 0.3], help="the countdowns to simulate in seconds")
+	parser.add_argument("--rounds", type=int, default=200, help="the number of rounds per configuration")
+	parser.add_argument("--target", type=float, nargs="*", default=[0.9, 0.7, 0.5, 0.3, 0.1], help="suggest configurations for these win rates")
+	parser.add_argument("--cache", default=DEFAULT_CACHE, help="the file to keep the results in")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of worker processes (default: all cores)")
+	args = parser.parse_args()
+	calibration = Calibration(args.cache)
+
+	def progress(done, total):
+		print(f"\rsimulated {done} of {total} chunks", end="", flush=True)
+
+	if calibration.calibrate(grid(args.ships, args.sky, args.missiles, args.speed), args.rounds, args.workers, progress=progress):
+		print()
+	print(f"rules version {calibration.version}, {len(calibration.results)} configurations in {args.cache}")
+	print()
+	print(f"{'difficulty':12} {'ships':>5} {'sky':>4} {'missiles':>8} {'speed':>6} {'win rate':>9} {'destroyed':>10}")
+	for name, (num_ships, sky_height, num_missiles, speed) in alien_shower.DIFFICULTIES.items():
+		estimate = calibration.estimate((num_ships, sky_height, num_missiles, speed))
+		config = normalize(num_ships, sky_height, num_missiles, speed)
+		print(f"{name:12} {config[0]:5} {config[1]:4} {config[2]:8} {config[3]:6} " + (f"{estimate[0]:9.1%} {estimate[1]:10.1f}" if estimate else f"{'-':>9} {'-':>10}"))
+	for target in args.target:
+		config = calibration.suggest(target)
+		if config:
+			estimate = calibration.estimate(config)
+			print(f"{f'~{target:.0%}':12} {config[0]:5} {config[1]:4} {config[2]:8} {config[3]:6} {estimate[0]:9.1%} {estimate[1]:10.1f}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,614 @@
+##
+ # Checks that the faster implementations of the rules of Alien Shower agree with update_state.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# each check plays random rounds through update_state and another implementation of the rules and raises
+# AssertionError at the first difference, run them after changing update_state (the soak plays the whole game loop
+# instead and hangs if the loop stops passing time, the scheduler check times steps as the game loop does and the
+# broadcast check plays the stream of a game to spectators, the keys check reads and applies the keys of a frame)
+
+import os
+import re
+import sys
+import time
+import codecs
+import random
+import socket
+import argparse
+import tempfile
+import itertools
+
+import alien_sim
+import alien_wave
+import alien_shower
+import alien_solver
+import alien_broadcast
+import alien_tournament
+from alien_state import GameState
+from alien_render import A_BOLD, A_DIM, A_ITALIC, A_UNDERLINE, color_pair
+
+# small boards as (num_ships, sky_height, num_missiles), the sky height is adjusted as ingame
+SMALL_BOARDS = [(2, 1, 1), (2, 3, 2), (3, 2, 1), (3, 2, 2), (3, 4, 2), (4, 3, 1), (4, 3, 2), (4, 4, 3), (5, 4, 2)]
+# boards to play randomly, from the smallest to the hard difficulty and a tall sky
+PLAY_BOARDS = [(2, 1, 1), (3, 2, 4), (5, 4, 2), (7, 12, 2), (10, 4, 3)]
+
+class Skipped(Exception):
+	"""Raised by a check that cannot run here, e.g. for lack of an optional dependency."""
+
+def random_action(rng, active_ship, ships, wait=1):
+	# any legal action or waiting with weight wait
+	return rng.choice(alien_shower.legal_actions(active_ship, ships) + [()] * wait)
+
+def winnable(state, known):
+	# exhaustive search over every sequence of actions (waiting included), the aliens fall with each step so
+	# no state repeats within a line of play
+	if state in known:
+		return known[state]
+	result = False
+	for action in state.legal_actions() + [()]:
+		after = state.step(action)
+		if after is True or after is not False and winnable(after, known):
+			result = True
+			break
+	known[state] = result
+	return result
+
+def check_solver(rounds, seed=0):
+	# the solver finds a plan exactly for the rounds that can be won, and its plans win under update_state
+	rng = random.Random(seed)
+	checked = 0
+	for num_ships, sky_height, num_missiles in SMALL_BOARDS:
+		solver = alien_solver.Solver(num_ships, sky_height, num_missiles)
+		for _ in range(rounds):
+			_, enemy_appearance = alien_shower.init_fleet(num_ships, num_missiles, rng)
+			plan = solver.solve(enemy_appearance)
+			expected = winnable(GameState.new(num_ships, solver.sky_height, num_missiles, enemy_appearance), {})
+			assert (plan is not None) == expected, f"solver on {num_ships}x{sky_height}x{num_missiles} with {enemy_appearance}: plan {plan}, winnable {expected}"
+			if plan is not None:
+				engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles)
+				engine.enemy_appearance = list(enemy_appearance)
+				for action in plan:
+					assert not engine.done and (not action or action in engine.legal_actions()), f"plan {plan} for {enemy_appearance} plays {action} illegally"
+					engine.step(action)
+				assert engine.done and engine.won, f"plan {plan} does not win {enemy_appearance}"
+			checked += 1
+	return checked
+
+def check_state(rounds, seed=0):
+	# GameState.step follows update_state (as played by GameEngine) step by step, it keeps no stats or feedback
+	rng = random.Random(seed)
+	steps = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		for _ in range(rounds):
+			engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=rng.randrange(2**32))
+			state = GameState.new(num_ships, engine.sky_height, num_missiles, engine.enemy_appearance)
+			while True:
+				assert state.legal_actions() == engine.legal_actions(), f"legal actions {state.legal_actions()} instead of {engine.legal_actions()} in {engine.observation()}"
+				action = random_action(rng, engine.active_ship, engine.ships)
+				before = engine.observation()
+				engine.step(action)
+				state = state.step(action)
+				steps += 1
+				if engine.done:
+					assert state is engine.won, f"{action} in {before} ends in {state} instead of {'won' if engine.won else 'lost'}"
+					break
+				assert state not in (True, False), f"{action} in {before} ends the round in GameState only"
+				round_ = (engine.ships, engine.active_ship, engine.active_enemy, engine.active_shots, engine.enemy_appearance)
+				assert state.to_round() == round_, f"{action} in {before} leads to {state.to_round()} instead of {round_}"
+				packed = GameState.from_round(engine.sky_height, num_missiles, *round_)
+				assert packed == state and hash(packed) == hash(state), f"{round_} packs to a different state"
+	# the shots of skies taller than 16 bits keep their position (too tall to play through here)
+	round_ = (["inactive", "active"], {"pos": 1, "lifetime": 3, "base": 1, "shots": 1}, {"pos_x": 1, "pos_y": 5}, [{"pos_x": 1, "pos_y": 69999}], [0, 1])
+	unpacked = GameState.from_round(70000, 2, *round_).to_round()
+	assert unpacked == round_, f"{round_} on a sky of 70000 unpacks to {unpacked}"
+	return steps
+
+def check_batch(rounds, seed=0, num_games=100):
+	# BatchGame follows update_state in every game, stats, final stats and feedback included
+	# imported here as only the batch needs NumPy (an optional dependency)
+	try:
+		import numpy as np
+	except ImportError:
+		raise Skipped("NumPy is not installed (pip install numpy)")
+	import alien_batch
+	actions = {alien_batch.WAIT: (), alien_batch.LEFT: alien_solver.LEFT, alien_batch.RIGHT: alien_solver.RIGHT, alien_batch.SHOOT: alien_solver.SHOOT}
+	rng = np.random.default_rng(seed)
+	steps = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		batch = alien_batch.BatchGame(num_games, num_ships, sky_height, num_missiles, seed)
+		games = [batch.game(i) for i in range(num_games)]
+		stats = [batch.stats(i) for i in range(num_games)]
+		feedback = [alien_batch.FEEDBACK[alien_batch.NONE]] * num_games
+		played = 0
+		while played < rounds:
+			kinds, values = batch.random_actions(rng, wait=int(rng.integers(0, 3)))
+			# the key 0 activates the last ship as -1
+			values = np.where((kinds == alien_batch.ACTIVATE) & (values == num_ships - 1) & (rng.random(num_games) < 0.5), -1, values)
+			running = np.flatnonzero(~batch.done)
+			batch.step(kinds, values)
+			for i in running:
+				ships, active_ship, active_enemy, active_shots, enemy_appearance = games[i]
+				game_stats, final_stats = stats[i]
+				action = alien_solver.activate(int(values[i])) if kinds[i] == alien_batch.ACTIVATE else actions[kinds[i]]
+				done, feedback[i] = alien_shower.update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, batch.sky_height, num_missiles,
+					game_stats, action, final_stats, feedback[i])
+				steps += 1
+				assert done == batch.done[i], f"game {i} on {num_ships}x{sky_height}x{num_missiles}: {action} ends the round in only one of them"
+				assert done or batch.game(i) == games[i], f"game {i} on {num_ships}x{sky_height}x{num_missiles}: {action} leads to {batch.game(i)} instead of {games[i]}"
+				assert batch.stats(i) == stats[i], f"game {i} on {num_ships}x{sky_height}x{num_missiles}: stats {batch.stats(i)} instead of {stats[i]}"
+				assert alien_batch.FEEDBACK[batch.feedback[i]] == feedback[i], f"game {i} on {num_ships}x{sky_height}x{num_missiles}: feedback {alien_batch.FEEDBACK[batch.feedback[i]]!r} instead of {feedback[i]!r}"
+			done = np.flatnonzero(batch.done)
+			if len(done):
+				played += len(done)
+				batch.reset(done)
+				for i in done:
+					games[i] = batch.game(i)
+					stats[i][0]["destroyed"] = 0
+					feedback[i] = alien_batch.FEEDBACK[alien_batch.NONE]
+	return steps
+
+def check_wave(rounds, seed=0):
+	# a wave without interval (one alien at a time) follows update_state, stats, final stats and feedback included
+	rng = random.Random(seed)
+	steps = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		sky_height = alien_shower.winnable_sky_height(num_ships, sky_height, num_missiles)
+		for _ in range(rounds):
+			ships, enemy_appearance = alien_shower.init_fleet(num_ships, num_missiles, rng)
+			reference = [ships, enemy_appearance, {}, {}, [], {"wins": 0, "losses": 0, "destroyed": 0}, alien_shower.new_final_stats(), ""]
+			played = [ships.copy(), enemy_appearance.copy(), {}, alien_wave.Wave(), [], {"wins": 0, "losses": 0, "destroyed": 0}, alien_shower.new_final_stats(), ""]
+			while True:
+				ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, feedback = reference
+				action = random_action(rng, active_ship, ships)
+				done, reference[7] = alien_shower.update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+				ships, enemy_appearance, active_ship, wave, active_shots, stats, final_stats, feedback = played
+				wave_done, played[7] = alien_wave.update_wave(active_ship, wave, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+				steps += 1
+				assert (wave_done, played[7]) == (done, reference[7]), f"{action} ends in {(wave_done, played[7])} instead of {(done, reference[7])}"
+				assert wave.lowest() == reference[3] and wave.enemies() == ([reference[3]] if reference[3] else []), f"{action} leaves the aliens {wave.enemies()} instead of {reference[3]}"
+				assert played[:3] + played[4:7] == reference[:3] + reference[4:7], f"{action} leads to {played[:3] + played[4:7]} instead of {reference[:3] + reference[4:7]}"
+				if done:
+					break
+	return steps
+
+def update_aliens(active_ship, aliens, interval, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback):
+	# update_wave with the aliens as list from the lowest, moved one by one and compared with every shot (aliens
+	# holds the list as "enemies" and the steps since the last alien appeared as "since")
+	done, feedback = alien_shower.update_ship(active_ship, active_shots, ships, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+	if done:
+		return True, feedback
+	enemies = aliens["enemies"]
+	i = 0
+	while i < len(active_shots):
+		shot = active_shots[i]
+		hit = [enemy for enemy in enemies if enemy["pos_x"] == shot["pos_x"] and enemy["pos_y"] == shot["pos_y"]]
+		hit = hit or [enemy for enemy in enemies if enemy["pos_x"] == shot["pos_x"] and enemy["pos_y"] == shot["pos_y"] - 1]
+		if hit:
+			enemies.remove(hit[0])
+			del active_shots[i]
+			stats["destroyed"] += 1
+			feedback = "alien destroyed     " + "\n" + " " * 20
+			final_stats["aliens destroyed"][0] += 1
+			continue
+		if shot["pos_y"] < 0:
+			stats["losses"] += 1
+			final_stats["missed shots"][0] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "missed shot          \nhit return to retry "
+		shot["pos_y"] -= 1
+		i += 1
+	if enemies:
+		for enemy in enemies:
+			enemy["pos_y"] += 1
+		aliens["since"] += 1
+		if enemies[0]["pos_y"] >= sky_height:
+			stats["losses"] += 1
+			final_stats["missed defence"][0] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "missing defence      \nhit return to retry "
+	if not enemies or aliens["since"] >= interval:
+		if enemy_appearance:
+			enemies.append({"pos_x": enemy_appearance.pop(), "pos_y": 0})
+			aliens["since"] = 0
+			final_stats["aliens destroyed"][1] += 1
+		elif not enemies:
+			stats["wins"] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "all aliens destroyed\nhit return for more "
+	return False, feedback
+
+def check_intervals(rounds, seed=0):
+	# a wave with an interval follows update_aliens, the aliens on screen, stats, final stats and feedback included
+	rng = random.Random(seed)
+	steps = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		sky_height = alien_shower.winnable_sky_height(num_ships, sky_height, num_missiles)
+		for interval in (1, 2, 3, 5):
+			for _ in range(rounds):
+				ships, enemy_appearance = alien_shower.init_fleet(num_ships, num_missiles, rng)
+				reference = [ships, enemy_appearance, {}, {"enemies": [], "since": 0}, [], {"wins": 0, "losses": 0, "destroyed": 0}, alien_shower.new_final_stats(), ""]
+				played = [ships.copy(), enemy_appearance.copy(), {}, alien_wave.Wave(interval), [], {"wins": 0, "losses": 0, "destroyed": 0}, alien_shower.new_final_stats(), ""]
+				while True:
+					ships, enemy_appearance, active_ship, aliens, active_shots, stats, final_stats, feedback = reference
+					action = random_action(rng, active_ship, ships)
+					done, reference[7] = update_aliens(active_ship, aliens, interval, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+					ships, enemy_appearance, active_ship, wave, active_shots, stats, final_stats, feedback = played
+					wave_done, played[7] = alien_wave.update_wave(active_ship, wave, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+					steps += 1
+					assert (wave_done, played[7]) == (done, reference[7]), f"interval {interval}: {action} ends in {(wave_done, played[7])} instead of {(done, reference[7])}"
+					enemies = aliens["enemies"]
+					assert wave.enemies() == enemies and wave.lowest() == (enemies[0] if enemies else {}), f"interval {interval}: {action} leaves the aliens {wave.enemies()} instead of {enemies}"
+					assert played[:3] + played[4:7] == reference[:3] + reference[4:7], f"interval {interval}: {action} leads to {played[:3] + played[4:7]} instead of {reference[:3] + reference[4:7]}"
+					if done:
+						break
+	return steps
+
+def check_soak(rounds, seed=0):
+	# the full game loop plays random keys on a virtual clock to the end at every difficulty and the smallest board at
+	# a fast countdown, the same every run and with stats that add up, about 200 rounds are played per virtual hour
+	played = 0
+	for num_ships, sky_height, num_missiles, speed in list(alien_shower.DIFFICULTIES.values()) + [(2, 1, 1, 0.5)]:
+		board = f"{num_ships}x{sky_height}x{num_missiles} at {speed}s"
+		stats, final_stats, keys = alien_sim.soak(rounds * 18, num_ships, sky_height, num_missiles, speed, seed)
+		assert alien_sim.soak(rounds * 18, num_ships, sky_height, num_missiles, speed, seed) == (stats, final_stats, keys), f"{board}: differs between runs"
+		ended = stats["wins"] + stats["losses"]
+		assert ended and keys, f"{board}: {ended} rounds and {keys} keys played"
+		assert final_stats["missed defence"][1] == ended, f"{board}: {final_stats['missed defence'][1]} defences of {ended} rounds"
+		lost = final_stats["missed defence"][0] + final_stats["missed shots"][0] + final_stats["ships lifetime expired"][0]
+		assert lost == stats["losses"], f"{board}: {lost} reasons for {stats['losses']} losses"
+		assert all(0 <= count <= possible for count, possible in final_stats.values()), f"{board}: final stats {final_stats}"
+		played += ended
+	return played
+
+def check_record(rounds, seed=0):
+	# sessions recorded on the virtual clock replay to the same stats, with speed changes (to beyond 32.767s, the
+	# largest countdown of 16 bits in ms) and solvable rounds, and the log holds boards of more than 16 bits
+	played = 0
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "session.log")
+		for num_ships, sky_height, num_missiles, speed, solvable in [(5, 4, 2, 1, False), (5, 4, 2, 1, True), (10, 4, 2, 0.5, False), (7, 12, 2, 33, False)]:
+			board = f"{num_ships}x{sky_height}x{num_missiles} at {speed}s{' (solvable)' if solvable else ''}"
+			stats, final_stats, _ = alien_sim.soak(rounds * 18, num_ships, sky_height, num_missiles, speed, seed, solvable, alien_sim.KEYS + b"+-", path)
+			replayed = alien_shower.replay(path)
+			assert replayed == (stats, final_stats), f"{board}: replays to {replayed} instead of {(stats, final_stats)}"
+			played += stats["wins"] + stats["losses"]
+		# the header holds boards beyond 16 bits (too large to play through here)
+		expected = {"num_ships": 70000, "sky_height": 70000, "num_missiles": 70000, "timeleft": 1.0, "seed": seed, "solvable": False}
+		recorder = alien_shower.SessionRecorder(path, 70000, 70000, 70000, 1.0, seed)
+		recorder.close(0)
+		header, _ = alien_shower.read_session(path)
+		assert header == expected, f"the header of a 70000x70000x70000 board reads as {header}"
+	return played
+
+def check_snapshot(rounds, seed=0):
+	# a snapshot restores to the round it was taken of and the random number generator continues with the same
+	# rounds, both in GameEngine and for a game suspended on escape and resumed
+	rng = random.Random(seed)
+	checked = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		for _ in range(rounds):
+			engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=rng.randrange(2**32))
+			# the snapshot may be taken of a round just over
+			for _ in range(rng.randrange(3 * num_ships * num_missiles)):
+				if engine.done:
+					engine.reset()
+				engine.step(random_action(rng, engine.active_ship, engine.ships))
+			timeleft = rng.choice([0.1, 1, 33.1])
+			data = engine.snapshot(timeleft)
+			state = alien_shower.restore(data)
+			round_ = (engine.ships, engine.enemy_appearance, engine.active_ship, engine.active_enemy, engine.active_shots, engine.stats, engine.final_stats, timeleft, engine.sky_height, num_missiles)
+			restored = tuple(state[key] for key in ("ships", "enemy_appearance", "active_ship", "active_enemy", "active_shots", "stats", "final_stats", "timeleft", "sky_height", "num_missiles"))
+			assert restored == round_, f"{round_} restores to {restored}"
+			resumed = alien_shower.GameEngine(2, 1, 1)
+			resumed.restore(data)
+			assert (resumed.done, resumed.won) == (engine.done, engine.won), f"{round_} restores to done {resumed.done}, won {resumed.won}"
+			# play on into the next round
+			for _ in range(2):
+				while not engine.done:
+					action = random_action(rng, engine.active_ship, engine.ships)
+					assert resumed.observation() == engine.observation(), f"resumed at {round_} leads to {resumed.observation()} instead of {engine.observation()}"
+					engine.step(action)
+					resumed.step(action)
+				engine.reset()
+				resumed.reset()
+			checked += 1
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "suspended")
+		for game_seed in range(seed, seed + max(1, rounds // 20)):
+			# random keys for a few minutes, then escape just after starting a round
+			clock = alien_sim.VirtualClock()
+			script = alien_sim.random_script(random.Random(game_seed))
+			script = itertools.chain(itertools.takewhile(lambda entry: clock.now < 180, script), [(0.1, 10), (0.1, ord("1"))])
+			alien_shower.game(alien_sim.ScriptedScreen(script, clock), 5, 4, 2, 1, True, suspend=path, clock=clock, seed=game_seed)
+			with open(path, "rb") as suspended:
+				data = suspended.read()
+			# leaving the resumed game at once has to suspend the same round with the same random number generator
+			clock = alien_sim.VirtualClock()
+			alien_shower.game(alien_sim.ScriptedScreen([], clock), 5, 4, 2, 1, True, suspend=path, clock=clock)
+			with open(path, "rb") as suspended:
+				assert suspended.read() == data, f"the game of seed {game_seed} is suspended differently after resuming"
+			os.remove(path)
+			checked += 1
+	return checked
+
+def check_scheduler(rounds, seed=0):
+	# TickScheduler on a virtual clock, waiting as told by its timeouts: a step lands on its deadline (within the
+	# millisecond a wait is rounded up to) after counting down from 5 to 1, waits are never 0 while the step is not
+	# due, also across speed changes and a suspended process
+	rng = random.Random(seed)
+	steps = 0
+	for interval in (alien_shower.MIN_TIMELEFT, 0.0013, 0.03, 0.3, 0.5, 1, 33):
+		# rounding at the boundaries of the parts must not leave nothing to wait for, as after waiting whole
+		# milliseconds from a step right on time (it takes many start times to meet the rounding)
+		for _ in range(rounds * 20):
+			clock = alien_sim.VirtualClock(rng.uniform(0, 1000))
+			scheduler = alien_shower.TickScheduler(interval, clock.perf_counter)
+			for part in range(1, 5):
+				at = scheduler.last + round(part * scheduler.interval / 5 * 1000) / 1000
+				assert at >= scheduler.deadline or scheduler.timeout(at) >= 1, f"interval {interval}: waits {scheduler.timeout(at)}ms {at - scheduler.last}s after {scheduler.last}"
+		clock = alien_sim.VirtualClock(rng.uniform(0, 1000))
+		scheduler = alien_shower.TickScheduler(interval, clock.perf_counter)
+		for _ in range(rounds):
+			countdowns = []
+			now = clock.perf_counter()
+			while not scheduler.due(now):
+				countdowns.append(scheduler.countdown(now))
+				timeout = scheduler.timeout(now)
+				assert timeout >= 1, f"interval {scheduler.interval}: waits {timeout}ms {scheduler.deadline - now}s before the step"
+				clock.sleep(timeout / 1000)
+				now = clock.perf_counter()
+			assert scheduler.timeout(now) == 0, f"interval {scheduler.interval}: waits {scheduler.timeout(now)}ms for a step that is due"
+			assert countdowns == sorted(countdowns, reverse=True), f"interval {scheduler.interval}: counts down {countdowns}"
+			# with parts longer than the millisecond of a wait, every part is shown down to 1 (a step after a speed
+			# change may start further down the countdown)
+			if scheduler.interval / 5 > 0.001 and countdowns and countdowns[0] == 5:
+				assert sorted(set(countdowns), reverse=True) == [5, 4, 3, 2, 1], f"interval {scheduler.interval}: counts down {countdowns}"
+			deadline = scheduler.deadline
+			lateness = scheduler.advance(now)
+			steps += 1
+			assert 0 <= lateness < 0.001 + 1e-9 and lateness == now - deadline, f"interval {scheduler.interval}: a step {lateness}s after its deadline"
+			assert scheduler.deadline == deadline + scheduler.interval, f"interval {scheduler.interval}: the next deadline drifts to {scheduler.deadline - deadline}s"
+			if rng.random() < 0.05:
+				# a speed change keeps the countdown running
+				scheduler.set_interval(interval * rng.choice((0.5, 2)))
+			elif rng.random() < 0.02:
+				# after a suspended process the deadlines start over instead of catching up on the missed steps
+				clock.sleep(scheduler.interval * (scheduler.catch_up + 1 + rng.random()))
+				now = clock.perf_counter()
+				assert scheduler.due(now) and scheduler.timeout(now) == 0, f"interval {scheduler.interval}: no step due after a suspend"
+				scheduler.advance(now)
+				steps += 1
+				assert scheduler.deadline == now + scheduler.interval, f"interval {scheduler.interval}: catches up after a suspend"
+	return steps
+
+def check_planner(rounds, seed=0):
+	# the planner without a deadline (as the solver bot plays) suggests legal actions and wins exactly the rounds the
+	# solver finds a plan for, and a short tournament of the solver bot wins at least as many rounds as the greedy one
+	rng = random.Random(seed)
+	played = 0
+	for num_ships, sky_height, num_missiles in SMALL_BOARDS:
+		for _ in range(rounds):
+			engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=rng.randrange(2**32))
+			winnable = alien_solver.solve(num_ships, sky_height, num_missiles, engine.enemy_appearance) is not None
+			planner = alien_solver.Planner(num_ships, sky_height, num_missiles)
+			while not engine.done:
+				action = planner.suggest(engine.state(), None)
+				assert not action or action in engine.legal_actions(), f"suggests {action} in {engine.observation()}"
+				engine.step(action)
+			assert engine.won == winnable, f"{'loses' if winnable else 'wins'} a round on {num_ships}x{sky_height}x{num_missiles} the solver {'can' if winnable else 'cannot'} win"
+			played += 1
+	config = (5, 4, 2)
+	seeds = list(range(seed, seed + max(10, rounds // 4)))
+	totals = alien_tournament.tournament(["solver", "greedy"], [config], seeds, workers=2, chunk_size=max(1, len(seeds) // 2))
+	solver, greedy = totals[("solver", config)], totals[("greedy", config)]
+	assert solver["rounds"] == greedy["rounds"] == len(seeds), f"the tournament plays {solver['rounds']} and {greedy['rounds']} of {len(seeds)} rounds"
+	assert solver["wins"] >= greedy["wins"], f"the solver bot wins {solver['wins']} rounds, the greedy one {greedy['wins']}"
+	return played + 2 * len(seeds)
+
+# the escape sequences of a broadcast (cursor moves, attributes, clearing, the cursor shown or hidden) or a character
+ESCAPE = re.compile("\x1b\\[([0-9;?]*)([A-Za-z])|([^\x1b])")
+SGR_ATTRS = {"1": A_BOLD, "2": A_DIM, "3": A_ITALIC, "4": A_UNDERLINE, "31": color_pair(1), "32": color_pair(2)}
+
+class Terminal:
+	"""Plays a broadcast onto cells as a CellScreen keeps them, to compare what a spectator sees with the screen."""
+
+	def __init__(self, sock, height, width):
+		self.sock = sock
+		self.decoder = codecs.getincrementaldecoder("utf-8")()
+		self.chars = [[" "] * width for _ in range(height)]
+		self.attrs = [[0] * width for _ in range(height)]
+		self.y = self.x = self.attr = 0
+
+	def read(self):
+		# play all that was sent so far
+		data = []
+		while True:
+			try:
+				chunk = self.sock.recv(65536)
+			except BlockingIOError:
+				break
+			if not chunk:
+				break
+			data.append(chunk)
+		for match in ESCAPE.finditer(self.decoder.decode(b"".join(data))):
+			params, command, char = match.groups()
+			if char is not None:
+				self.chars[self.y][self.x] = char
+				self.attrs[self.y][self.x] = self.attr
+				self.x += 1
+			elif command == "H":
+				y, x = params.split(";")
+				self.y, self.x = int(y) - 1, int(x) - 1
+			elif command == "m":
+				self.attr = sum(SGR_ATTRS.get(code, 0) for code in params.split(";"))
+			elif command == "J":
+				for row in self.chars:
+					row[:] = " " * len(row)
+				for row in self.attrs:
+					row[:] = [0] * len(row)
+
+def check_broadcast(rounds, seed=0):
+	# spectators of a broadcast see the screen of the game after every frame, the first from the start with deltas
+	# and keyframes, others joining during the game from the keyframe they start with
+	rng = random.Random(seed)
+	frames = 0
+	height, width = 24, 80
+	view = (10, height - 15)
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "broadcast")
+		for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+			board = f"{num_ships}x{sky_height}x{num_missiles}"
+			broadcaster = alien_broadcast.Broadcaster(path, height, width, keyframe_interval=rng.choice((7, alien_broadcast.KEYFRAME_INTERVAL)))
+			spectators = []
+
+			def join():
+				sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+				sock.connect(path)
+				sock.setblocking(False)
+				spectators.append(Terminal(sock, height, width))
+
+			def draw(world, color=0):
+				broadcaster.draw(world, color)
+				screen = broadcaster.screen
+				for i, spectator in enumerate(spectators):
+					spectator.read()
+					assert spectator.chars == screen.chars and spectator.attrs == screen.attrs, f"{board}: spectator {i} sees a different screen after frame {broadcaster.encoder.frames}"
+
+			join()
+			engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=rng.randrange(2**32))
+			for _ in range(max(1, rounds // 10)):
+				world = alien_shower.init_world(num_ships, engine.sky_height, engine.stats["wins"], engine.stats["losses"], view=view)
+				broadcaster.clear()
+				draw(world)
+				while not engine.done:
+					action = random_action(rng, engine.active_ship, engine.ships)
+					engine.step(action)
+					alien_shower.update_world(world, engine.sky_height, engine.active_ship, engine.active_enemy, engine.active_shots, engine.ships,
+						engine.enemy_appearance, engine.stats, rng.randint(1, 5), engine.feedback, action[2] if action else "wait  ", view)
+					if rng.random() < 0.02:
+						join()
+					draw(world)
+					frames += 1
+				draw(world, 2 if engine.won else 1)
+				engine.reset()
+			broadcaster.close()
+			for spectator in spectators:
+				spectator.sock.close()
+	return frames
+
+def key_action(key, legal, num_ships, first_x=None, columns=None):
+	# the action an action key asks for if it is legal, else None (the keys count from first_x over the columns shown
+	# on a scrolled board, else the key 0 wakes the last ship as -1)
+	if key in b"1234567890":
+		value = key - 49
+		if first_x is not None:
+			if value % 10 >= columns:
+				return None
+			value = first_x + value % 10
+		action = alien_solver.activate(value)
+		return action if alien_solver.activate(value if value >= 0 else num_ships - 1) in legal else None
+	action = {ord("a"): alien_solver.LEFT, ord("d"): alien_solver.RIGHT, ord("s"): alien_solver.SHOOT}.get(key)
+	return action if action in legal else None
+
+def check_keys(rounds, seed=0):
+	# read_keys takes all keys pending in a frame (up to an escape) and process_keys applies them in order: the speed
+	# keys add up, escape leaves and of the action keys the last legal one wins over the ones before and the action
+	# chosen earlier in the step, on scrolled boards as well
+	rng = random.Random(seed)
+	keys = alien_sim.KEYS + b"+-+-\x1b"
+	checked = 0
+	for num_ships, sky_height, num_missiles in PLAY_BOARDS:
+		for _ in range(rounds):
+			engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=rng.randrange(2**32))
+			for _ in range(rng.randrange(3 * num_ships * num_missiles)):
+				engine.step(random_action(rng, engine.active_ship, engine.ships))
+				if engine.done:
+					engine.reset()
+			burst = [rng.choice(keys) for _ in range(rng.randint(1, 8))]
+			# all keys of the burst are pending by the end of the wait, the key after it is not
+			clock = alien_sim.VirtualClock()
+			screen = alien_sim.ScriptedScreen([(rng.uniform(0, 0.5), burst[0])] + [(0, key) for key in burst[1:]] + [(1, ord("a"))], clock)
+			read = alien_shower.read_keys(screen, 1000, clock.perf_counter)
+			pending = burst[:burst.index(27) + 1] if 27 in burst else burst
+			assert [key for key, _ in read] == pending, f"reads {read} of the keys {burst}"
+			assert len({at for _, at in read}) == 1, f"reads the keys {burst} at different times {read}"
+			first_x = columns = None
+			if rng.random() < 0.5:
+				columns = rng.randint(1, num_ships)
+				first_x = rng.randint(0, num_ships - columns)
+			legal = engine.legal_actions()
+			next_action = rng.choice(legal + [()])
+			timeleft = rng.choice((alien_shower.MIN_TIMELEFT, 0.3, 1))
+			expected = (True, next_action, timeleft)
+			for key in pending:
+				if key == 27:
+					expected = (False,) + expected[1:]
+				elif key in b"+-":
+					expected = expected[:2] + (max(expected[2] - 0.1, alien_shower.MIN_TIMELEFT) if key == ord("+") else expected[2] + 0.1,)
+				else:
+					action = key_action(key, legal, num_ships, first_x, columns)
+					if action:
+						expected = (True, action, expected[2])
+			in_game, action, timeleft, _ = alien_shower.process_keys(pending, engine.active_ship, engine.ships, next_action, timeleft, engine.feedback, first_x, columns)
+			assert (in_game, action, timeleft) == expected, f"the keys {bytes(pending)} after {next_action} in {engine.observation()} give {(in_game, action, timeleft)} instead of {expected}"
+			checked += 1
+	return checked
+
+# name, what is compared and the check
+CHECKS = {
+	"solver": ("rounds of small boards against exhaustive search", check_solver),
+	"state": ("steps of GameState against update_state", check_state),
+	"batch": ("game steps of BatchGame against update_state", check_batch),
+	"wave": ("steps of a wave without interval against update_state", check_wave),
+	"intervals": ("steps of waves with intervals against a list of aliens", check_intervals),
+	"soak": ("rounds of random keys through the game loop on a virtual clock", check_soak),
+	"record": ("rounds recorded on a virtual clock against their replay", check_record),
+	"snapshot": ("rounds and games restored from a snapshot against the original", check_snapshot),
+	"scheduler": ("steps of the tick scheduler on a virtual clock", check_scheduler),
+	"broadcast": ("frames broadcast against the screen seen by spectators", check_broadcast),
+	"keys": ("frames of pending keys read and applied", check_keys),
+	"planner": ("rounds played by the planner without a deadline and in a tournament", check_planner),
+}
+
+def main():
+	parser = argparse.ArgumentParser(description="Check the faster implementations of the rules against update_state over random play.")
+	parser.add_argument("--checks", nargs="+", choices=list(CHECKS), default=list(CHECKS), help="the checks to run (default: all)")
+	parser.add_argument("--rounds", type=int, default=200, help="the rounds to play per check and board")
+	parser.add_argument("--seed", type=int, default=0, help="the seed of the rounds and the actions")
+	args = parser.parse_args()
+	if not __debug__:
+		# python -O strips the asserts the checks are made of, they would pass without checking anything
+		parser.error("the checks are asserts, run them without -O")
+	failed = False
+	for name in args.checks:
+		description, check = CHECKS[name]
+		start = time.perf_counter()
+		try:
+			count = check(args.rounds, args.seed)
+		except AssertionError as error:
+			print(f"{name}: FAILED: {error}")
+			failed = True
+			continue
+		except Skipped as reason:
+			print(f"{name}: skipped, {reason}")
+			continue
+		print(f"{name}: ok, {count} {description} ({time.perf_counter() - start:.1f}s)")
+	sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+	main()
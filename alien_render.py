@@ -0,0 +1,229 @@
+##
+ # Render backends for Alien Shower: curses, buffered ANSI escape sequences or no output at all.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+# a screen is anything with the methods of a curses window the game uses: addstr, clear, refresh, getmaxyx,
+# timeout and getch (curses is only imported by its backend)
+
+import os
+import sys
+import time
+import shutil
+import select
+import functools
+import collections
+
+# the attributes with the values of curses, so that drawing does not need curses
+A_NORMAL = 0
+A_UNDERLINE = 0x20000
+A_DIM = 0x100000
+A_BOLD = 0x200000
+A_ITALIC = 0x80000000
+A_COLOR = 0xff00
+
+def color_pair(number):
+	# the attribute of a color pair as curses.color_pair gives it
+	return number << 8
+
+@functools.lru_cache(maxsize=None)
+def sgr(attr):
+	# the ANSI escape sequence for the curses attributes used by the game
+	codes = ["0"]
+	if attr & A_BOLD:
+		codes.append("1")
+	if attr & A_DIM:
+		codes.append("2")
+	if attr & A_ITALIC:
+		codes.append("3")
+	if attr & A_UNDERLINE:
+		codes.append("4")
+	pair = (attr & A_COLOR) >> 8
+	if pair == 1:
+		codes.append("31")
+	elif pair == 2:
+		codes.append("32")
+	return f"\x1b[{';'.join(codes)}m"
+
+class AnsiScreen:
+	"""Stands in for a curses window, collecting what is drawn as ANSI escape sequences until take() is called."""
+	__slots__ = ("parts", "height", "width", "attr")
+
+	def __init__(self, height=24, width=80):
+		self.parts = []
+		self.height = height
+		self.width = width
+		self.attr = None
+
+	def addstr(self, y, x=0, text=None, attr=0):
+		# addstr(y, x, text[, attr]) or addstr(text[, attr]) as in curses
+		parts = self.parts
+		if text is None:
+			text = y
+			attr = x
+		else:
+			parts.append(f"\x1b[{y + 1};{x + 1}H")
+		# only switch attributes when they change
+		if attr != self.attr:
+			parts.append(sgr(attr))
+			self.attr = attr
+		if "\n" in text:
+			# like curses, a newline clears the rest of the line and continues at the start of the next one
+			text = text.replace("\n", "\x1b[K\r\n")
+		parts.append(text)
+
+	def clear(self):
+		self.parts.append("\x1b[0m\x1b[2J\x1b[H")
+		self.attr = 0
+
+	def getmaxyx(self):
+		return self.height, self.width
+
+	def refresh(self):
+		pass
+
+	def take(self):
+		data = "".join(self.parts).encode()
+		self.parts.clear()
+		return data
+
+def write_all(fd, data):
+	view = memoryview(data)
+	while view:
+		view = view[os.write(fd, view):]
+
+def parse_keys(data):
+	# the key codes of the bytes read from a terminal, skipping escape sequences (e.g. of the arrow keys) as curses
+	# does without keypad, but keeping a single escape
+	keys = []
+	i = 0
+	while i < len(data):
+		key = data[i]
+		i += 1
+		if key == 27 and i < len(data) and data[i] in b"[O":
+			i += 1
+			while i < len(data) and not 0x40 <= data[i] <= 0x7e:
+				i += 1
+			i += 1
+			continue
+		keys.append(10 if key == 13 else key)
+	return keys
+
+class TerminalScreen(AnsiScreen):
+	"""Draws a frame into one buffer and writes it to the terminal at once on refresh, reads keys like curses."""
+	__slots__ = ("fd_in", "fd_out", "delay", "keys")
+
+	def __init__(self, height=24, width=80, fd_in=0, fd_out=1):
+		super().__init__(height, width)
+		self.fd_in = fd_in
+		self.fd_out = fd_out
+		self.delay = -1
+		self.keys = collections.deque()
+
+	def refresh(self):
+		if self.parts:
+			write_all(self.fd_out, self.take())
+
+	def timeout(self, delay):
+		self.delay = delay
+
+	def getch(self):
+		# as in curses, waiting for a key shows what was drawn
+		self.refresh()
+		if not self.keys:
+			ready, _, _ = select.select([self.fd_in], [], [], None if self.delay < 0 else self.delay / 1000)
+			if not ready:
+				return -1
+			data = os.read(self.fd_in, 1024)
+			# leave once the input is closed
+			self.keys.extend(parse_keys(data) if data else [27])
+		return self.keys.popleft() if self.keys else -1
+
+class NullScreen:
+	"""Discards what is drawn and reads no keys, for headless runs.
+
+	Reads with a timeout wait it out as a terminal nobody types at, reads without one return escape to leave.
+	"""
+	__slots__ = ("height", "width", "delay")
+
+	def __init__(self, height=24, width=80):
+		self.height = height
+		self.width = width
+		self.delay = -1
+
+	def addstr(self, *args):
+		pass
+
+	def clear(self):
+		pass
+
+	def refresh(self):
+		pass
+
+	def getmaxyx(self):
+		return self.height, self.width
+
+	def timeout(self, delay):
+		self.delay = delay
+
+	def getch(self):
+		if self.delay < 0:
+			return 27
+		time.sleep(self.delay / 1000)
+		return -1
+
+def run_curses(main, *args):
+	import curses
+
+	def setup(stdscr):
+		# hide cursor
+		curses.curs_set(0)
+		# use colors as used per default in the terminal
+		curses.use_default_colors()
+		curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
+		curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
+		return main(stdscr, *args)
+
+	# curses waits a second after escape for the rest of an escape sequence, leave without the wait
+	os.environ.setdefault("ESCDELAY", "25")
+	return curses.wrapper(setup)
+
+def run_ansi(main, *args):
+	import tty
+	import termios
+	fd_in = sys.stdin.fileno()
+	fd_out = sys.stdout.fileno()
+	size = shutil.get_terminal_size()
+	attributes = termios.tcgetattr(fd_in)
+	# switch to the alternate screen and hide the cursor as curses does
+	write_all(fd_out, b"\x1b[?1049h\x1b[?25l")
+	try:
+		tty.setcbreak(fd_in)
+		return main(TerminalScreen(size.lines, size.columns, fd_in, fd_out), *args)
+	finally:
+		termios.tcsetattr(fd_in, termios.TCSADRAIN, attributes)
+		write_all(fd_out, b"\x1b[0m\x1b[?25h\x1b[?1049l")
+
+def run_null(main, *args):
+	return main(NullScreen(), *args)
+
+# run main(screen, *args) on the screen of a backend, restoring the terminal afterwards
+BACKENDS = {
+	"curses": run_curses,
+	"ansi": run_ansi,
+	"null": run_null,
+}
@@ -0,0 +1,375 @@
+##
+ # Serve Alien Shower to many terminals at once over a socket.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import time
+import heapq
+import random
+import asyncio
+import argparse
+import resource
+import itertools
+import functools
+import multiprocessing
+import concurrent.futures
+
+import alien_shower
+from alien_render import AnsiScreen
+
+# the shortest countdown a session may speed up to, keeps the ticks of all sessions bounded
+MIN_TIMELEFT = 0.1
+# keys as sent by terminals in raw mode mapped to the key codes of curses
+KEYS = {13: 10}
+# the connections waiting to be accepted, enough for the players of a load test connecting at once
+BACKLOG = 4096
+
+def deal(num_ships, sky_height, num_missiles, seed):
+	# the fleet and the aliens of a solvable round and its feedback, in a worker process as the search for a winnable
+	# order can take the better part of a second
+	rng = random.Random(seed)
+	ships, enemy_appearance = alien_shower.init_fleet(num_ships, num_missiles, rng)
+	feedback = alien_shower.shuffle_solvable(enemy_appearance, num_ships, sky_height, num_missiles, rng, " " * 20 + "\n" + " " * 20)
+	return ships, enemy_appearance, feedback
+
+class Scheduler:
+	"""Drives the countdown ticks of all sessions from a single timer heap on the event loop."""
+
+	def __init__(self, loop):
+		self.loop = loop
+		self.heap = []
+		self.counter = itertools.count()
+		self.timer = None
+		self.ticks = 0
+		self.lateness = alien_shower.Histogram()
+
+	def schedule(self, session, deadline):
+		heapq.heappush(self.heap, (deadline, next(self.counter), session))
+		if self.timer is None or deadline < self.timer.when():
+			if self.timer:
+				self.timer.cancel()
+			self.timer = self.loop.call_at(deadline, self.run_due)
+
+	def run_due(self):
+		self.timer = None
+		heap = self.heap
+		now = self.loop.time()
+		while heap and heap[0][0] <= now:
+			deadline, _, session = heapq.heappop(heap)
+			self.lateness.add(now - deadline)
+			self.ticks += 1
+			interval = session.tick()
+			if interval:
+				# keep to the deadlines of the session, but do not catch up on ticks missed by more than an interval
+				heapq.heappush(heap, (max(deadline + interval, now), next(self.counter), session))
+		if heap:
+			self.timer = self.loop.call_at(heap[0][0], self.run_due)
+
+class Session(asyncio.Protocol):
+	"""A game of one connected terminal, following the flow of game() without blocking: waiting for return to start
+	a round, playing it on the ticks of the scheduler and showing the score on escape.
+
+	The next round is dealt while the current one is played, off the event loop if it has to be solvable, and a
+	round only starts once its deal is ready.
+	"""
+	__slots__ = ("server", "transport", "screen", "renderer", "paused", "phase", "rng", "dealt", "stats", "final_stats", "ships",
+		"enemy_appearance", "world", "active_ship", "active_enemy", "active_shots", "next_action", "timeleft", "feedback", "countdown")
+
+	def __init__(self, server):
+		self.server = server
+		self.transport = None
+		self.screen = AnsiScreen()
+		self.renderer = alien_shower.WorldRenderer()
+		self.paused = False
+		self.phase = "start"
+
+	def connection_made(self, transport):
+		self.transport = transport
+		server = self.server
+		if len(server.sessions) >= server.max_sessions:
+			transport.write(b"Alien Shower is full, try again later.\r\n")
+			transport.close()
+			self.phase = "closed"
+			return
+		server.sessions.add(self)
+		self.rng = random.Random()
+		self.stats = {"wins": 0, "losses": 0, "destroyed": 0}
+		self.final_stats = alien_shower.new_final_stats()
+		self.timeleft = server.timeleft
+		self.feedback = " " * 20 + "\n" + " " * 20
+		self.deal()
+		self.screen.addstr("\x1b[?25l")
+		self.screen.clear()
+		alien_shower.draw_world(self.screen, alien_shower.game_snapshot(server.num_ships, server.sky_height, server.num_missiles, ["inactive"] * server.num_ships))
+		self.flush()
+
+	def connection_lost(self, exc):
+		self.phase = "closed"
+		self.server.sessions.discard(self)
+
+	def pause_writing(self):
+		# skip drawing while the terminal does not keep up, the renderer catches up on the next frame
+		self.paused = True
+
+	def resume_writing(self):
+		self.paused = False
+		if self.phase == "play":
+			self.draw()
+
+	def data_received(self, data):
+		for key in data:
+			self.key(KEYS.get(key, key))
+			if self.phase == "closed":
+				return
+		self.flush()
+
+	def key(self, key):
+		if self.phase == "play":
+			in_game, self.next_action, timeleft, self.feedback = alien_shower.process_keys((key,), self.active_ship, self.ships, self.next_action, self.timeleft, self.feedback)
+			self.timeleft = max(timeleft, MIN_TIMELEFT)
+			if in_game:
+				self.draw()
+			else:
+				self.show_score()
+		elif self.phase in ("start", "over", "dealing"):
+			if key == 10 and self.phase != "dealing":
+				self.start_round()
+			elif key == 27:
+				self.show_score()
+		elif self.phase == "score":
+			self.screen.clear()
+			self.screen.addstr("\x1b[?25h")
+			self.flush()
+			self.transport.close()
+			self.phase = "closed"
+
+	def deal(self):
+		# deal the next round, a solvable one in the process pool of the server
+		server = self.server
+		if server.solvable:
+			self.dealt = server.loop.run_in_executor(server.pool, deal, server.num_ships, server.sky_height, server.num_missiles, self.rng.randrange(2**64))
+		else:
+			self.dealt = server.loop.create_future()
+			self.dealt.set_result(alien_shower.init_fleet(server.num_ships, server.num_missiles, self.rng) + (" " * 20 + "\n" + " " * 20,))
+
+	def dealt_round(self, dealt):
+		# the deal the session waited for is ready (unless it left meanwhile)
+		if self.phase == "dealing":
+			self.start_round()
+			self.flush()
+
+	def new_round(self):
+		self.ships, self.enemy_appearance, self.feedback = self.dealt.result()
+		self.world = alien_shower.init_world(len(self.ships), self.server.sky_height, self.stats["wins"], self.stats["losses"], self.feedback)
+		self.deal()
+		self.active_ship = {}
+		self.active_enemy = {}
+		self.active_shots = []
+		self.next_action = ()
+		self.stats["destroyed"] = 0
+
+	def start_round(self):
+		if not self.dealt.done():
+			self.phase = "dealing"
+			self.dealt.add_done_callback(self.dealt_round)
+			return
+		self.new_round()
+		self.phase = "play"
+		self.countdown = 5
+		self.screen.clear()
+		self.renderer.invalidate()
+		self.draw()
+		self.server.scheduler.schedule(self, self.server.loop.time() + self.timeleft / 5)
+
+	def tick(self):
+		# one step of the countdown, a game step every fifth, returns the time to the next tick or None to stop
+		if self.phase != "play":
+			return None
+		self.countdown -= 1
+		if self.countdown == 0:
+			new_game, self.feedback = alien_shower.update_state(self.active_ship, self.active_enemy, self.active_shots, self.ships, self.enemy_appearance,
+				self.server.sky_height, self.server.num_missiles, self.stats, self.next_action, self.final_stats, self.feedback)
+			self.next_action = ()
+			self.countdown = 5
+			if new_game:
+				self.update()
+				self.phase = "over"
+				self.screen.clear()
+				alien_shower.draw_world(self.screen, self.world, 2 if "all aliens destroyed" in self.feedback else 1)
+				self.flush()
+				return None
+		self.draw()
+		self.flush()
+		return self.timeleft / 5
+
+	def update(self):
+		alien_shower.update_world(self.world, self.server.sky_height, self.active_ship, self.active_enemy, self.active_shots, self.ships,
+			self.enemy_appearance, self.stats, self.countdown, self.feedback, self.next_action[2] if self.next_action else "wait  ")
+
+	def draw(self):
+		self.update()
+		if not self.paused:
+			self.renderer.draw(self.screen, self.world)
+
+	def show_score(self):
+		self.phase = "score"
+		alien_shower.show_score(self.screen, self.stats, self.final_stats)
+
+	def flush(self):
+		data = self.screen.take()
+		if data and self.phase != "closed":
+			self.transport.write(data)
+
+class Server:
+	"""Accepts terminal sessions on a TCP or Unix socket, all ticked by one scheduler."""
+
+	def __init__(self, num_ships, sky_height, num_missiles, timeleft, solvable=False, max_sessions=10000):
+		self.num_ships = num_ships
+		self.sky_height = alien_shower.winnable_sky_height(num_ships, sky_height, num_missiles)
+		self.num_missiles = num_missiles
+		self.timeleft = max(timeleft, MIN_TIMELEFT)
+		self.solvable = solvable
+		self.max_sessions = max_sessions
+		self.sessions = set()
+		self.loop = None
+		self.scheduler = None
+		# the workers dealing solvable rounds
+		self.pool = None
+
+	async def serve(self, host="localhost", port=7111, unix=None, stats_interval=0):
+		self.loop = asyncio.get_running_loop()
+		self.scheduler = Scheduler(self.loop)
+		if self.solvable:
+			# workers forked from the server would hold on to the sockets of the sessions connected meanwhile
+			self.pool = concurrent.futures.ProcessPoolExecutor(mp_context=multiprocessing.get_context("forkserver"))
+		if unix:
+			server = await self.loop.create_unix_server(lambda: Session(self), unix, backlog=BACKLOG)
+		else:
+			server = await self.loop.create_server(lambda: Session(self), host, port, backlog=BACKLOG)
+		print(f"serving Alien Shower on {unix or f'{host}:{port}'}", flush=True)
+		if stats_interval:
+			self.loop.call_later(stats_interval, self.print_stats, stats_interval, time.perf_counter(), 0)
+		try:
+			async with server:
+				await server.serve_forever()
+		finally:
+			if self.pool:
+				self.pool.shutdown(wait=False)
+
+	def print_stats(self, interval, last_time, last_ticks):
+		now = time.perf_counter()
+		scheduler = self.scheduler
+		lateness = scheduler.lateness
+		print(f"sessions: {len(self.sessions):6}  ticks/s: {(scheduler.ticks - last_ticks) / (now - last_time):8.0f}  "
+			f"tick lateness p50: {lateness.percentile(0.5) * 1000:6.1f} ms  p99: {lateness.percentile(0.99) * 1000:6.1f} ms  "
+			f"max rss: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:6.1f} MB", flush=True)
+		scheduler.lateness = alien_shower.Histogram()
+		self.loop.call_later(interval, self.print_stats, interval, now, scheduler.ticks)
+
+async def player(connect, rng, duration, results):
+	# a simulated player pressing random keys, starting new rounds until the time is up
+	try:
+		start = time.perf_counter()
+		reader, writer = await connect()
+		results["connect"].add(time.perf_counter() - start)
+	except OSError:
+		results["failed"] += 1
+		return
+	results["connected"] += 1
+
+	async def read():
+		while True:
+			data = await reader.read(65536)
+			if not data:
+				break
+			results["bytes"] += len(data)
+
+	reading = asyncio.ensure_future(read())
+	try:
+		writer.write(b"\r")
+		end = time.perf_counter() + duration
+		while time.perf_counter() < end and not reading.done():
+			await asyncio.sleep(rng.uniform(0.05, 0.5))
+			writer.write(bytes([rng.choice(b"12345adss\r")]))
+			results["keys"] += 1
+		# leave and quit the score screen
+		writer.write(b"\x1b\x1b ")
+		await asyncio.wait_for(reading, 5)
+	except (OSError, asyncio.TimeoutError):
+		results["dropped"] += 1
+	finally:
+		reading.cancel()
+		writer.close()
+
+async def load(clients, duration, host="localhost", port=7111, unix=None, seed=None, concurrency=100):
+	if unix:
+		connect = functools.partial(asyncio.open_unix_connection, unix)
+	else:
+		connect = functools.partial(asyncio.open_connection, host, port)
+	results = {"connected": 0, "failed": 0, "dropped": 0, "keys": 0, "bytes": 0, "connect": alien_shower.Histogram()}
+	rng = random.Random(seed)
+	# limit the connections being opened at once, not the players
+	opening = asyncio.Semaphore(concurrency)
+
+	async def limited_connect():
+		async with opening:
+			return await connect()
+
+	start = time.perf_counter()
+	await asyncio.gather(*(player(limited_connect, random.Random(rng.random()), duration, results) for _ in range(clients)))
+	elapsed = time.perf_counter() - start
+	connect_time = results["connect"]
+	print(f"clients: {clients}, connected: {results['connected']}, failed: {results['failed']}, dropped: {results['dropped']}")
+	print(f"connect p50: {connect_time.percentile(0.5) * 1000:.1f} ms, p99: {connect_time.percentile(0.99) * 1000:.1f} ms")
+	print(f"keys sent: {results['keys'] / elapsed:.0f}/s, received: {results['bytes'] / elapsed / 1024:.0f} kB/s")
+	return results
+
+def raise_file_limit():
+	# thousands of sessions need as many file descriptors
+	soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+	try:
+		resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+	except (ValueError, OSError):
+		pass
+
+def main():
+	parser = argparse.ArgumentParser(description="Serve Alien Shower to terminals over a socket (connect with e.g. socat -,raw,echo=0 TCP:localhost:7111) or load test a server.")
+	parser.add_argument("mode", choices=["serve", "load"], help="run a server or simulate players connecting to one")
+	parser.add_argument("--host", default="localhost", help="the host to serve on or connect to")
+	parser.add_argument("--port", type=int, default=7111, help="the TCP port to serve on or connect to")
+	parser.add_argument("--unix", metavar="PATH", help="use a Unix socket at this path instead of TCP")
+	parser.add_argument("--difficulty", choices=list(alien_shower.DIFFICULTIES), default="normal", help="the difficulty of all sessions")
+	parser.add_argument("--solvable", action="store_true", help="only play rounds that can be won")
+	parser.add_argument("--max_sessions", type=int, default=10000, help="the number of sessions accepted at once")
+	parser.add_argument("--stats", type=float, default=5, metavar="SECONDS", help="print server stats at this interval (0 for never)")
+	parser.add_argument("--clients", type=int, default=1000, help="the number of simulated players")
+	parser.add_argument("--duration", type=float, default=30, help="the seconds each simulated player plays")
+	parser.add_argument("--seed", type=int, default=None, help="the seed of the simulated players")
+	args = parser.parse_args()
+	raise_file_limit()
+	if args.mode == "serve":
+		num_ships, sky_height, num_missiles, speed = alien_shower.DIFFICULTIES[args.difficulty]
+		server = Server(num_ships, sky_height, num_missiles, speed, args.solvable, args.max_sessions)
+		try:
+			asyncio.run(server.serve(args.host, args.port, args.unix, args.stats))
+		except KeyboardInterrupt:
+			pass
+	else:
+		asyncio.run(load(args.clients, args.duration, args.host, args.port, args.unix, args.seed))
+
+if __name__ == "__main__":
+	main()
@@ -17,16 +17,28 @@
  # along with this program.  If not, see <https://www.gnu.org/licenses/>.
 ##
 
-import curses
+import os
 import time
+import mmap
 import random
 import argparse
+import struct
+import json
+import signal
+import math
+import collections
+import functools
 
-def addstr_format(stdscr, x, y, string, *positions, form=[curses.A_BOLD], split_at=" "):
+import alien_solver
+import alien_render
+from alien_state import GameState, activate, winnable_sky_height
+from alien_render import A_NORMAL, A_BOLD, A_DIM, A_ITALIC, A_UNDERLINE, color_pair
+
+def addstr_format(stdscr, x, y, string, *positions, form=[A_BOLD], split_at=" "):
 	if not positions:
 		return
 	if len(form) < 2:
-		form.append(curses.A_NORMAL)
+		form = form + [A_NORMAL]
 	string_array = string.split(split_at)
 	stdscr.addstr(x, y, "")
 	last_pos = 0
@@ -40,59 +52,67 @@ def addstr_format(stdscr, x, y, string, *positions, form=[curses.A_BOLD], split_
 		last_pos = pos + 1
 	stdscr.addstr(split_at.join(string_array[last_pos:]), form[1])
 
+def wait_for_key(stdscr, keys=(10,)):
+	# block until one of the keys is pressed instead of polling
+	stdscr.timeout(-1)
+	while True:
+		key = stdscr.getch()
+		if key in keys:
+			return key
+
 def show_help(stdscr, num_missiles, num_ships):
 	stdscr.clear()
-	while stdscr.getch() != 10:
-		addstr_format(stdscr, 0, 0, "Welcome to Alien Shower.", 2, 3)
-		stdscr.addstr(2, 0, "Your task is to protect the earth from invading aliens.")
-		stdscr.addstr(3, 0, "To fulfill this task you have a fleet of ships at your disposal.")
-		stdscr.addstr(4, 0, "You will need all of them to succeed.")
-		stdscr.addstr(6, 0, "(Press return to resume...)", curses.A_ITALIC)
+	addstr_format(stdscr, 0, 0, "Welcome to Alien Shower.", 2, 3)
+	stdscr.addstr(2, 0, "Your task is to protect the earth from invading aliens.")
+	stdscr.addstr(3, 0, "To fulfill this task you have a fleet of ships at your disposal.")
+	stdscr.addstr(4, 0, "You will need all of them to succeed.")
+	stdscr.addstr(6, 0, "(Press return to resume...)", A_ITALIC)
+	wait_for_key(stdscr)
 	stdscr.clear()
-	while stdscr.getch() != 10:
-		stdscr.addstr(0, 0, "Controls:", curses.A_UNDERLINE)
-		addstr_format(stdscr, 2, 0, "You can activate any ship by pressing the respective number.", 2, 4, 9)
-		addstr_format(stdscr, 3, 0, "You can steer left and right by pressing \"a\" or \"d\".", 2, 8, 10)
-		addstr_format(stdscr, 4, 0, "You can shoot by pressing \"s\".", 2, 5)
-		addstr_format(stdscr, 5, 0, "You can increase/decrease the speed by pressing \"+\"/\"-\".", 4, 7)
-		addstr_format(stdscr, 6, 0, "You can end the game and view your score by pressing \"escape\".", 2, 11)
-		addstr_format(stdscr, 7, 0, "After each round, you can start a new one by pressing \"return\".", 5, 11)
-		stdscr.addstr(9, 0, "(Press return to resume...)", curses.A_ITALIC)
+	stdscr.addstr(0, 0, "Controls:", A_UNDERLINE)
+	addstr_format(stdscr, 2, 0, "You can activate any ship by pressing the respective number.", 2, 4, 9)
+	addstr_format(stdscr, 3, 0, "You can steer left and right by pressing \"a\" or \"d\".", 2, 8, 10)
+	addstr_format(stdscr, 4, 0, "You can shoot by pressing \"s\".", 2, 5)
+	addstr_format(stdscr, 5, 0, "You can increase/decrease the speed by pressing \"+\"/\"-\".", 4, 7)
+	addstr_format(stdscr, 6, 0, "You can end the game and view your score by pressing \"escape\".", 2, 11)
+	addstr_format(stdscr, 7, 0, "After each round, you can start a new one by pressing \"return\".", 5, 11)
+	stdscr.addstr(9, 0, "(Press return to resume...)", A_ITALIC)
+	wait_for_key(stdscr)
 	stdscr.clear()
-	while stdscr.getch() != 10:
-		stdscr.addstr(0, 0, "Warning:", curses.A_UNDERLINE)
-		addstr_format(stdscr, 2, 0, f"Each ship can only move {(num_ships*num_missiles)//2} times.", 4, 5, 6)
-		addstr_format(stdscr, 3, 0, f"Each ship can only fire {num_missiles} times.", 4, 5, 6)
-		addstr_format(stdscr, 4, 0, "You may only have one ship active at a time.", 4, 5, 6)
-		addstr_format(stdscr, 5, 0, "You cannot deactivate a ship. Once one is wracked you may activate a new one.", 1, 2, 11, 12, 13)
-		addstr_format(stdscr, 6, 0, "You have a small time frame to decide on an action, before an alien moves again.", 4, 5)
-		stdscr.addstr(8, 0, "(Press return to resume...)", curses.A_ITALIC)
+	stdscr.addstr(0, 0, "Warning:", A_UNDERLINE)
+	addstr_format(stdscr, 2, 0, f"Each ship can only move {(num_ships*num_missiles)//2} times.", 4, 5, 6)
+	addstr_format(stdscr, 3, 0, f"Each ship can only fire {num_missiles} times.", 4, 5, 6)
+	addstr_format(stdscr, 4, 0, "You may only have one ship active at a time.", 4, 5, 6)
+	addstr_format(stdscr, 5, 0, "You cannot deactivate a ship. Once one is wracked you may activate a new one.", 1, 2, 11, 12, 13)
+	addstr_format(stdscr, 6, 0, "You have a small time frame to decide on an action, before an alien moves again.", 4, 5)
+	stdscr.addstr(8, 0, "(Press return to resume...)", A_ITALIC)
+	wait_for_key(stdscr)
 	stdscr.clear()
-	while stdscr.getch() != 10:
-		stdscr.addstr(0, 0, "You will win, if:", curses.A_UNDERLINE)
-		addstr_format(stdscr, 2, 0, "You destroy all aliens.", 1, 2)
-		stdscr.addstr(4, 0, "You will loose, if:", curses.A_UNDERLINE)
-		addstr_format(stdscr, 6, 0, "You miss a shot.", 1)
-		addstr_format(stdscr, 7, 0, "A ship's lifetime expires before it makes it's last shot.", 2, 3)
-		addstr_format(stdscr, 8, 0, "The aliens hit the ground.", 1, 2)
-		stdscr.addstr(10, 0, "(Press return to resume...)", curses.A_ITALIC)
+	stdscr.addstr(0, 0, "You will win, if:", A_UNDERLINE)
+	addstr_format(stdscr, 2, 0, "You destroy all aliens.", 1, 2)
+	stdscr.addstr(4, 0, "You will loose, if:", A_UNDERLINE)
+	addstr_format(stdscr, 6, 0, "You miss a shot.", 1)
+	addstr_format(stdscr, 7, 0, "A ship's lifetime expires before it makes it's last shot.", 2, 3)
+	addstr_format(stdscr, 8, 0, "The aliens hit the ground.", 1, 2)
+	stdscr.addstr(10, 0, "(Press return to resume...)", A_ITALIC)
+	wait_for_key(stdscr)
 	stdscr.clear()
-	while stdscr.getch() != 10:
-		stdscr.addstr(0, 0, "Remember:", curses.A_UNDERLINE)
-		addstr_format(stdscr, 2, 0, f"Activate: {' '.join(list(map(lambda x: str(x % 10), range(1, num_ships + 1))))}", 0)
-		addstr_format(stdscr, 3, 0, "Move: a d", 0)
-		addstr_format(stdscr, 4, 0, "Shoot: s", 0)
-		addstr_format(stdscr, 6, 0, "Change Speed: + -", 0, 1)
-		stdscr.addstr(8, 0, "Look ahead to where the next enemy will come from and plan your move.")
-		stdscr.addstr(9, 0, "But don't take too much time to act.")
-		stdscr.addstr(10, 0, "Have fun!")
-		stdscr.addstr(12, 0, "(Press return to resume to a gameboard overview, press return again to start...)", curses.A_ITALIC)
-
-def game_snapshot(num_ships, sky_height, num_missiles, ships):
+	stdscr.addstr(0, 0, "Remember:", A_UNDERLINE)
+	addstr_format(stdscr, 2, 0, f"Activate: {' '.join(list(map(lambda x: str(x % 10), range(1, min(num_ships, 10) + 1))))}", 0)
+	addstr_format(stdscr, 3, 0, "Move: a d", 0)
+	addstr_format(stdscr, 4, 0, "Shoot: s", 0)
+	addstr_format(stdscr, 6, 0, "Change Speed: + -", 0, 1)
+	stdscr.addstr(8, 0, "Look ahead to where the next enemy will come from and plan your move.")
+	stdscr.addstr(9, 0, "But don't take too much time to act.")
+	stdscr.addstr(10, 0, "Have fun!")
+	stdscr.addstr(12, 0, "(Press return to resume to a gameboard overview, press return again to start...)", A_ITALIC)
+	wait_for_key(stdscr)
+
+def game_snapshot(num_ships, sky_height, num_missiles, ships, view=None):
 	# copy the ships to leave them unchanged for the game
 	ships = ships.copy()
 	# initialize a world
-	world = []
+	world = World()
 
 	# add an enemy and enemy look-ahead
 	active_enemy = {}
@@ -167,7 +187,7 @@ def game_snapshot(num_ships, sky_height, num_missiles, ships):
 		while ships[start_ship_at] != "inactive":
 			start_ship_at = (enemy_appearance[-1] - i) % 9
 			i -= 1
-		next_action = f"wake {start_ship_at + 1}"
+		next_action = activate(start_ship_at)[2]
 	# set move action for active ship unless there is a reason to shoot
 	elif sky_height > 1 and (active_ship["pos"] != active_enemy["pos_x"] or active_ship["pos"] == active_shots[0]["pos_x"]):
 		next_action = "move <"
@@ -175,104 +195,250 @@ def game_snapshot(num_ships, sky_height, num_missiles, ships):
 		next_action = "fire *"
 
 	# create the world
-	update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, countdown, feedback, next_action)
+	update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, countdown, feedback, next_action, view)
 	return world
 
-def init_game(num_ships, sky_height, num_missiles, wins=0, losses=0, feedback=" " * 20 + "\n" + " " * 20):
-	# init ships
-	ships = []
-	for i in range(num_ships):
-		ships.append("inactive")
+def new_final_stats():
+	return {
+		"aliens destroyed": [0, 0],
+		"moves made": [0, 0],
+		"missed defence": [0, 0],
+		"missed shots": [0, 0],
+		"ships lifetime expired": [0, 0]
+	}
 
+def init_fleet(num_ships, num_missiles, rng=random):
+	# init ships
+	ships = ["inactive"] * num_ships
 	# init enemies (as positions they will appear at)
 	enemy_appearance = list(range(num_ships)) * num_missiles
-	random.shuffle(enemy_appearance)
+	rng.shuffle(enemy_appearance)
+	return ships, enemy_appearance
+
+def shuffle_solvable(enemy_appearance, num_ships, sky_height, num_missiles, rng, feedback):
+	# reorder the aliens so that the round can be won, or keep the feedback and tell if no such order was found in
+	# time (the round is played in the order shuffled last)
+	if alien_solver.shuffle_solvable(enemy_appearance, num_ships, sky_height, num_missiles, rng):
+		return feedback
+	return "no winnable order   " + "\n" + "found in time       "
 
-	# init world
-	world = []
+@functools.lru_cache(maxsize=None)
+def static_rows(num_ships):
+	# rows which only depend on the number of ships
 	width = num_ships*3 + num_ships - 1
+	return {
+		"empty": " " * width,
+		"border": "_" * width,
+		"ground": "." * width,
+		"labels": " ".join(f"({i})" for i in range(1, min(10, num_ships + 1))) + (" (0)" if num_ships == 10 else ""),
+	}
+
+def place(row, i, sprite):
+	# replace the 3-character cell i of a row
+	return row[:i*4] + sprite + row[i*4+3:]
+
+def view_size(num_ships, sky_height, view=None):
+	# the number of columns and sky rows shown, view limits them to a viewport of (columns, rows)
+	if view is None:
+		return num_ships, sky_height
+	return min(num_ships, view[0]), min(sky_height, view[1])
+
+def scroll(first, focus, size, total):
+	# move the first index shown by a viewport only when the focus comes close to its edges
+	margin = min(2, (size - 1)//2)
+	if focus < first + margin:
+		first = focus - margin
+	elif focus > first + size - 1 - margin:
+		first = focus - size + 1 + margin
+	return max(0, min(first, total - size))
+
+class World(list):
+	"""The rows of the game board as drawn by draw_world, patched in place by update_world.
+
+	Boards larger than the viewport only keep the rows and columns shown, starting at origin.
+	"""
+	__slots__ = ("sky", "origin")
+
+	def __init__(self, rows=()):
+		super().__init__(rows)
+		# sprites currently shown in the sky by cell (column, row) of the viewport, None if the sky rows are unknown
+		self.sky = None
+		# the first column and sky row shown
+		self.origin = (0, 0)
+
+def init_game(num_ships, sky_height, num_missiles, wins=0, losses=0, feedback=" " * 20 + "\n" + " " * 20, solvable=False, rng=random, view=None):
+	# returns the fleet, the world and the feedback to show
+	ships, enemy_appearance = init_fleet(num_ships, num_missiles, rng)
+	if solvable:
+		feedback = shuffle_solvable(enemy_appearance, num_ships, sky_height, num_missiles, rng, feedback)
+	return ships, enemy_appearance, init_world(num_ships, sky_height, wins, losses, feedback, view), feedback
+
+def init_world(num_ships, sky_height, wins=0, losses=0, feedback=" " * 20 + "\n" + " " * 20, view=None):
+	columns, sky_rows = view_size(num_ships, sky_height, view)
+	rows = static_rows(columns)
+	width = len(rows["empty"])
+	world = World()
 	world.append((f"wins: {wins}, losses: {losses}",))
 	world.append(("aliens destroyed: 0  ",))
 	world.append(("",))
-	world.append((" " * width,))
-	world.append(("_" * width,))
-	for i in range(sky_height):
+	world.append((rows["empty"],))
+	world.append((rows["border"],))
+	for i in range(sky_rows):
 		world.append(("   " * width,))
-	world.append(("." * width,))
-	world.append((" ".join(" w " for i in range(num_ships)),))
-	world.append((" ".join(f"({i})" for i in range(1, min(10, num_ships + 1))) + (" (0)" if num_ships == 10 else ""),))
+	world.append((rows["ground"],))
+	world.append((" ".join(" w " for i in range(columns)),))
+	world.append((rows["labels"],))
 	world.append(("",))
 	world.append((f"do: wait    in: {chr(0x25a0) * (5 - 1)}", [1]))
-	world.append(("life : ", [0, 1], [curses.A_DIM]))
-	world.append(("shots: ", [0], [curses.A_DIM]))
+	world.append(("life : ", [0, 1], [A_DIM]))
+	world.append(("shots: ", [0], [A_DIM]))
 	world.append(("",))
 	world.append((feedback,))
 
-	return ships, enemy_appearance, world
+	return world
 
-def update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, countdown, feedback, next_action):
+def update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, countdown, feedback, next_action, view=None, hint=None, enemies=None):
+	# enemies are all aliens on screen in wave mode (active_enemy being the lowest of them)
 	num_ships = len(ships)
-	world.clear()
-	world.append((f"wins: {stats['wins']}, losses: {stats['losses']}",))
-	world.append((f"aliens destroyed: {stats['destroyed']}",))
-	world.append(("",))
-	world.append((" ".join(" m " if enemy_appearance and enemy_appearance[-1] == i else "   " for i in range(num_ships)),))
-	world.append(("_" * len(world[-1][0]),))
-	for j in range(sky_height):
-		world.append((" ".join(" * " if active_shots and any(pos["pos_x"] == i and pos["pos_y"] == j for pos in active_shots)
-								else " m " if active_enemy and active_enemy["pos_x"] == i and active_enemy["pos_y"] == j
-								else "   " for i in range(num_ships)),))
-	fleet = " ".join(" w " if ships[i] == "inactive" else "   " for i in range(num_ships))
+	columns, sky_rows = view_size(num_ships, sky_height, view)
+	rows = static_rows(columns)
+	# follow the active ship (or the alien to defend against) and the alien with the viewport
+	first_x, first_y = world.origin
+	if columns < num_ships:
+		focus = active_ship["pos"] if active_ship else active_enemy["pos_x"] if active_enemy else enemy_appearance[-1] if enemy_appearance else first_x
+		first_x = scroll(first_x, focus, columns, num_ships)
+	if sky_rows < sky_height:
+		first_y = scroll(first_y, active_enemy["pos_y"] if active_enemy else sky_height - 1, sky_rows, sky_height)
+	# (re)build the sky if it is unknown, the size does not fit or the viewport moved
+	if world.sky is None or len(world) != sky_rows + 14 or world.origin != (first_x, first_y):
+		world[:] = [("",)] * 5 + [(rows["empty"],)] * sky_rows + [("",)] * 9
+		world.sky = {}
+		world.origin = (first_x, first_y)
+	world[0] = (f"wins: {stats['wins']}, losses: {stats['losses']}",)
+	world[1] = (f"aliens destroyed: {stats['destroyed']}",)
+	if (columns, sky_rows) != (num_ships, sky_height):
+		world[2] = (f"ships {first_x + 1}-{first_x + columns} of {num_ships}, sky {first_y + 1}-{first_y + sky_rows} of {sky_height}",)
+	# mark the next alien at the edge if it comes from outside the viewport
+	if not enemy_appearance:
+		world[3] = (rows["empty"],)
+	elif enemy_appearance[-1] < first_x:
+		world[3] = (place(rows["empty"], 0, "<m "),)
+	elif enemy_appearance[-1] >= first_x + columns:
+		world[3] = (place(rows["empty"], columns - 1, " m>"),)
+	else:
+		world[3] = (place(rows["empty"], enemy_appearance[-1] - first_x, " m "),)
+	world[4] = (rows["border"],)
+	# index the sky by cell of the viewport (shots cover the enemy) and only rebuild the rows that changed
+	sky = {}
+	for enemy in enemies if enemies is not None else [active_enemy] if active_enemy else []:
+		pos_x = enemy["pos_x"] - first_x
+		pos_y = enemy["pos_y"] - first_y
+		if 0 <= pos_x < columns and 0 <= pos_y < sky_rows:
+			sky[(pos_x, pos_y)] = " m "
+	for shot in active_shots:
+		pos_x = shot["pos_x"] - first_x
+		pos_y = shot["pos_y"] - first_y
+		if 0 <= pos_x < columns and 0 <= pos_y < sky_rows:
+			sky[(pos_x, pos_y)] = " * "
+	last_sky = world.sky
+	changed_rows = {cell[1] for cell, sprite in sky.items() if last_sky.get(cell) != sprite}
+	changed_rows.update(cell[1] for cell in last_sky if cell not in sky)
+	sprites = {}
+	for (i, pos_y), sprite in sky.items():
+		if pos_y in changed_rows:
+			sprites.setdefault(pos_y, []).append((i, sprite))
+	for j in changed_rows:
+		row = rows["empty"]
+		for i, sprite in sprites.get(j, ()):
+			row = place(row, i, sprite)
+		world[5 + j] = (row,)
+	world.sky = sky
+	j = 5 + sky_rows
+	fleet = " ".join(" w " if ships[i] == "inactive" else "   " for i in range(first_x, first_x + columns))
 	if active_ship:
-		world.append((".".join(".w." if active_ship["pos"] == i else "..." for i in range(num_ships)), [active_ship["pos"]*4+1], [curses.A_BOLD], "."))
-		world.append((fleet, range(len(fleet.split(" "))), [curses.A_DIM]))
-		world.append((" ".join(f"({i})" for i in range(1, min(10, num_ships + 1))) + (" (0)" if num_ships == 10 else ""), range(num_ships), [curses.A_DIM | curses.color_pair(1)] if "ship already active" in feedback else [curses.A_DIM]))
+		pos = active_ship["pos"] - first_x
+		world[j] = (place(rows["ground"], pos, ".w."), [pos*4+1], [A_BOLD], ".")
+		world[j + 1] = (fleet, range(len(fleet.split(" "))), [A_DIM])
+		world[j + 2] = (rows["labels"], range(columns), [A_DIM | color_pair(1)] if "ship already active" in feedback else [A_DIM])
 	else:
-		world.append(("." * len(world[-1][0]),))
-		world.append((fleet, range(len(fleet.split(" ")))))
-		inactive_ships = [i for i in range(num_ships) if ships[i] != "inactive"]
+		world[j] = (rows["ground"],)
+		world[j + 1] = (fleet, range(len(fleet.split(" "))))
+		inactive_ships = [i - first_x for i in range(first_x, first_x + columns) if ships[i] != "inactive"]
 		if inactive_ships:
-			world.append((" ".join(f"({i})" for i in range(1, min(10, num_ships + 1))) + (" (0)" if num_ships == 10 else ""), inactive_ships, [curses.A_DIM | curses.color_pair(1)] if "already active" in feedback else [curses.A_DIM, curses.A_BOLD]))
+			world[j + 2] = (rows["labels"], inactive_ships, [A_DIM | color_pair(1)] if "already active" in feedback else [A_DIM, A_BOLD])
 		else:
-			world.append((" ".join(f"({i})" for i in range(1, min(10, num_ships + 1))) + (" (0)" if num_ships == 10 else ""),))
-	world.append(("",))
-	world.append((f"do: {next_action}  in: {chr(0x25a0) * (countdown - 1)}    ", [1, 2]))
+			world[j + 2] = (rows["labels"],)
+	if hint is not None:
+		world[j + 3] = (f"hint: {hint}  ", [0, 1, 2], [A_DIM])
+	world[j + 4] = (f"do: {next_action}  in: {chr(0x25a0) * (countdown - 1)}    ", [1, 2])
 	if not active_ship:
-		world.append(("life : " + " " * 13, [0, 1], [curses.A_DIM]))
-		world.append(("shots: " + " " * 13, [0], [curses.A_DIM]))
+		world[j + 5] = ("life : " + " " * 13, [0, 1], [A_DIM])
+		world[j + 6] = ("shots: " + " " * 13, [0], [A_DIM])
 	else:
 		life = active_ship['lifetime']
 		shots = active_ship['shots']
-		world.append((f"life : {chr(0xa4) * life + '   ' if life < 11 else chr(0xa4) * 10 + '+' + str(life - 10)}", [2]))
+		world[j + 5] = (f"life : {chr(0xa4) * life + '   ' if life < 11 else chr(0xa4) * 10 + '+' + str(life - 10)}", [2])
 		if life <= 3:
-			world[-1] = world[-1] + ([curses.A_BOLD | curses.color_pair(1)],)
-		world.append((f"shots: {'*' * shots + '   ' if shots < 11 else '*' * 10 + '+' + str(shots - 10)}    ", [1]))
-	world.append((" ",))
-	world.append((feedback,))
+			world[j + 5] = world[j + 5] + ([A_BOLD | color_pair(1)],)
+		world[j + 6] = (f"shots: {'*' * shots + '   ' if shots < 11 else '*' * 10 + '+' + str(shots - 10)}    ", [1])
+	world[j + 7] = (" ",)
+	world[j + 8] = (feedback,)
+
+def draw_row(stdscr, world, i, color=0):
+	tpl = world[i]
+	# mark feedback lines bold (and colored if color is > 0)
+	if i == len(world) - 1:
+		stdscr.addstr(i, 0, tpl[0], A_BOLD | color_pair(color))
+		return
+	# mark the rest as given by the other tuple elements
+	if len(tpl) > 3:
+		addstr_format(stdscr, i, 0, tpl[0], *tpl[1], form=tpl[2], split_at=tpl[3])
+	elif len(tpl) > 2:
+		addstr_format(stdscr, i, 0, tpl[0], *tpl[1], form=tpl[2])
+	elif len(tpl) > 1:
+		addstr_format(stdscr, i, 0, tpl[0], *tpl[1])
+	else:
+		stdscr.addstr(i, 0, tpl[0])
+	# mark win or loss if color is given
+	if i == 0 and color == 1:
+		addstr_format(stdscr, i, 0, tpl[0], 2, 3)
+	if i == 0 and color == 2:
+		addstr_format(stdscr, i, 0, tpl[0], 0, 1)
 
 def draw_world(stdscr, world, color=0):
-	world_len = len(world)
-	for i, tpl in enumerate(world):
-		# mark feedback lines bold (and colored if color is > 0)
-		if i in (world_len - 1,):
-			stdscr.addstr(i, 0, tpl[0], curses.A_BOLD | curses.color_pair(color))
-			continue
-		# mark the rest as given by the other tuple elements
-		if len(tpl) > 3:
-			addstr_format(stdscr, i, 0, tpl[0], *tpl[1], form=tpl[2], split_at=tpl[3])
-		elif len(tpl) > 2:
-			addstr_format(stdscr, i, 0, tpl[0], *tpl[1], form=tpl[2])
-		elif len(tpl) > 1:
-			addstr_format(stdscr, i, 0, tpl[0], *tpl[1])
-		else:
-			stdscr.addstr(i, 0, tpl[0])
-		# mark win or loss if color is given
-		if i == 0 and color == 1:
-			addstr_format(stdscr, i, 0, tpl[0], 2, 3)
-		if i == 0 and color == 2:
-			addstr_format(stdscr, i, 0, tpl[0], 0, 1)
+	for i in range(len(world)):
+		draw_row(stdscr, world, i, color)
+
+class WorldRenderer:
+	"""Draws a world like draw_world, but only rewrites the rows that changed since the previous frame."""
+
+	def __init__(self):
+		self.frame = []
+		self.color = 0
+
+	def invalidate(self):
+		# call after the screen was cleared to draw the next frame completely
+		self.frame = []
+
+	def draw(self, stdscr, world, color=0):
+		# returns whether anything was drawn, i.e. whether a refresh is needed
+		if color != self.color or len(world) != len(self.frame):
+			self.frame = []
+			self.color = color
+		frame = self.frame
+		changed = False
+		for i, tpl in enumerate(world):
+			if frame and frame[i] == tpl:
+				continue
+			draw_row(stdscr, world, i, color)
+			changed = True
+		self.frame = list(world)
+		return changed
+
+def update_ship(active_ship, active_shots, ships, sky_height, num_missiles, stats, next_action, final_stats, feedback):
+	# the action and the lifetime of the ship, the part of a step the rules of update_state and of a wave share,
+	# returns whether the round is lost and the feedback
 
-def update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback):
 	### process input ###
 
 	num_ships = len(ships)
@@ -308,8 +474,6 @@ def update_state(active_ship, active_enemy, active_shots, ships, enemy_appearanc
 		active_ship["shots"] -= 1
 		final_stats["missed shots"][1] += 1
 
-	### update game state ###
-
 	# check ship lifetime
 	if active_ship:
 		# based on movement and if a shot remains, loose the game
@@ -325,6 +489,15 @@ def update_state(active_ship, active_enemy, active_shots, ships, enemy_appearanc
 			ships[active_ship["base"]] = "wracked"
 			active_ship.clear()
 			feedback = "ship wracked        " + "\n" + " " * 20
+	return False, feedback
+
+def update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback):
+	done, feedback = update_ship(active_ship, active_shots, ships, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+	if done:
+		return True, feedback
+
+	### update game state ###
+
 	# move shots
 	i = 0
 	while i < len(active_shots):
@@ -369,25 +542,31 @@ def update_state(active_ship, active_enemy, active_shots, ships, enemy_appearanc
 			return True, "all aliens destroyed\nhit return for more "
 	return False, feedback
 
-def process_input(key, active_ship, ships, next_action, timeleft, feedback):
+# the shortest countdown in seconds the speed keys and options can set
+MIN_TIMELEFT = 0.001
+
+def process_input(key, active_ship, ships, next_action, timeleft, feedback, first_x=None, columns=None):
 	# leave on escape
 	if key == 27:
 		return False, next_action, timeleft, feedback
 	if key == 43: #+
 		feedback = "speed increased     " + "\n" + " " * 20
-		return True, next_action, timeleft - 0.1, feedback
+		return True, next_action, max(timeleft - 0.1, MIN_TIMELEFT), feedback
 	if key == 45: #-
 		feedback = "speed decreased     " + "\n" + " " * 20
 		return True, next_action, timeleft + 0.1, feedback
 	# gather next action from input
 	if not next_action:
 		num_ships = len(ships)
-		# activate ship
-		if not active_ship and key >= 48 and key < 58:
+		# activate ship (on boards wider than the viewport the keys count from its first column and only reach the
+		# columns shown)
+		if not active_ship and key >= 48 and key < 58 and (first_x is None or (key - 49) % 10 < columns):
 			value = key - 49
+			if first_x is not None:
+				value = first_x + value % 10
 			if value < num_ships:
 				if ships[value] == "inactive":
-					next_action = ("activate", value, f"wake {value + 1}")
+					next_action = activate(value)
 					feedback = " " * 20 + "\n" + " " * 20
 				else:
 					feedback = f"ship {value + 1} already active   " + "\n" + " " * 20
@@ -411,149 +590,763 @@ def process_input(key, active_ship, ships, next_action, timeleft, feedback):
 				feedback = "ship already active     " + "\n" + " " * 20
 	return True, next_action, timeleft, feedback
 
-def wait_for_start(stdscr, world, color=0):
-	stdscr.clear()
-	while True:
-		key = stdscr.getch()
+def read_keys(stdscr, delay, clock=time.perf_counter):
+	# wait up to delay milliseconds for a key, then take all keys pending without waiting, each with the time it was read
+	# (up to an escape, the keys after it do not matter)
+	keys = []
+	stdscr.timeout(delay)
+	key = stdscr.getch()
+	while key != -1:
+		keys.append((key, clock()))
 		if key == 27:
-			return True
-		draw_world(stdscr, world, color)
-		if key == 10:
 			break
-	return False
+		stdscr.timeout(0)
+		key = stdscr.getch()
+	return keys
+
+def process_keys(keys, active_ship, ships, next_action, timeleft, feedback, first_x=None, columns=None):
+	# apply the keys in the order they were read: escape and the speed keys at once, of the action keys the last one
+	# accepted wins (also over the action chosen earlier in the same step)
+	for key in keys:
+		in_game, action, timeleft, feedback = process_input(key, active_ship, ships, (), timeleft, feedback, first_x, columns)
+		if not in_game:
+			return False, next_action, timeleft, feedback
+		if action:
+			next_action = action
+	return True, next_action, timeleft, feedback
+
+def legal_actions(active_ship, ships):
+	# the actions process_input would accept as next action
+	num_ships = len(ships)
+	if not active_ship:
+		return [activate(i) for i in range(num_ships) if ships[i] == "inactive"]
+	actions = []
+	if active_ship["pos"] > 0:
+		actions.append(("move", "left", "move <"))
+	if active_ship["pos"] < num_ships - 1:
+		actions.append(("move", "right", "move >"))
+	if active_ship["shots"] > 0:
+		actions.append(("shoot", "", "fire *"))
+	return actions
+
+# compact view of a round: ship states, the active ship (pos -1 if none), the alien (pos_x -1 if none),
+# the shots as (pos_x, pos_y) tuples and the alien queue (next alien last)
+Observation = collections.namedtuple("Observation", ["ships", "ship_pos", "lifetime", "shots_left", "enemy_x", "enemy_y", "shots", "enemy_appearance", "done"])
+
+class GameEngine:
+	"""Headless game: runs the rules of update_state without curses, clock or rendering."""
+
+	def __init__(self, num_ships=5, sky_height=4, num_missiles=2, seed=None, solvable=False):
+		self.num_ships = num_ships
+		self.sky_height = winnable_sky_height(num_ships, sky_height, num_missiles)
+		self.num_missiles = num_missiles
+		self.solvable = solvable
+		self.rng = random.Random(seed)
+		self.stats = {"wins": 0, "losses": 0, "destroyed": 0}
+		self.final_stats = new_final_stats()
+		self.reset()
+
+	def reset(self, seed=None):
+		# start a new round, the overall stats are kept
+		if seed is not None:
+			self.rng.seed(seed)
+		self.ships, self.enemy_appearance = init_fleet(self.num_ships, self.num_missiles, self.rng)
+		self.active_ship = {}
+		self.active_enemy = {}
+		self.active_shots = []
+		self.stats["destroyed"] = 0
+		self.feedback = " " * 20 + "\n" + " " * 20
+		if self.solvable:
+			self.feedback = shuffle_solvable(self.enemy_appearance, self.num_ships, self.sky_height, self.num_missiles, self.rng, self.feedback)
+		self.done = False
+		self.won = False
+		return self.observation()
+
+	def legal_actions(self):
+		return legal_actions(self.active_ship, self.ships)
+
+	def step(self, action=()):
+		# action is one of legal_actions() or () to wait
+		if self.done:
+			raise RuntimeError("round is over, call reset() to start a new one")
+		wins = self.stats["wins"]
+		self.done, self.feedback = update_state(self.active_ship, self.active_enemy, self.active_shots, self.ships, self.enemy_appearance,
+			self.sky_height, self.num_missiles, self.stats, action, self.final_stats, self.feedback)
+		self.won = self.stats["wins"] > wins
+		return self.observation()
+
+	def state(self):
+		# the round as compact, hashable GameState
+		return GameState.from_round(self.sky_height, self.num_missiles, self.ships, self.active_ship, self.active_enemy, self.active_shots, self.enemy_appearance)
+
+	def observation(self):
+		ship = self.active_ship
+		enemy = self.active_enemy
+		return Observation(tuple(self.ships), ship["pos"] if ship else -1, ship["lifetime"] if ship else 0, ship["shots"] if ship else 0,
+			enemy["pos_x"] if enemy else -1, enemy["pos_y"] if enemy else -1,
+			tuple((shot["pos_x"], shot["pos_y"]) for shot in self.active_shots), tuple(self.enemy_appearance), self.done)
+
+	def snapshot(self, timeleft=0):
+		# the round, the stats and the random number generator as bytes to restore() from, e.g. to branch a search
+		return snapshot(self.ships, self.enemy_appearance, self.active_ship, self.active_enemy, self.active_shots, self.stats,
+			self.final_stats, timeleft, self.sky_height, self.num_missiles, self.rng, self.done, self.won)
+
+	def restore(self, data, offset=0):
+		# continue from a snapshot, returns its timeleft
+		state = restore(data, offset)
+		self.num_ships = len(state["ships"])
+		for key in ("ships", "enemy_appearance", "active_ship", "active_enemy", "active_shots", "stats", "final_stats", "sky_height", "num_missiles"):
+			setattr(self, key, state[key])
+		if state["rng"]:
+			self.rng = state["rng"]
+		self.feedback = " " * 20 + "\n" + " " * 20
+		self.done = state["done"]
+		self.won = state["won"]
+		return state["timeleft"]
+
+# a session log is a header followed by one record per accepted action and speed change and one for the end,
+# each record holding the game step it applies to and the seconds since the start of the session
+LOG_MAGIC = b"ASHR"
+LOG_VERSION = 4
+LOG_HEADER = struct.Struct("<4sBIIIdQ?") # magic, version, ships, sky height, missiles, timeleft, seed, solvable
+LOG_RECORD = struct.Struct("<Idbi") # step, seconds, kind, value (the ship or the timeleft in ms)
+LOG_END = 0
+LOG_ACTIVATE = 1
+LOG_LEFT = 2
+LOG_RIGHT = 3
+LOG_SHOOT = 4
+LOG_SPEED = 5
 
-def game(stdscr, num_ships, sky_height, num_missiles, timeleft, no_help):
-	# check for sky height plus game stats not exceeding terminal height
+class SessionRecorder:
+	"""Writes the seed of a session and the actions accepted by process_input to a small binary log."""
+
+	def __init__(self, path, num_ships, sky_height, num_missiles, timeleft, seed, solvable=False, clock=time.perf_counter):
+		self.file = open(path, "wb")
+		self.file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, num_ships, sky_height, num_missiles, timeleft, seed, solvable))
+		self.clock = clock
+		self.start = clock()
+
+	def write(self, step, kind, value=0):
+		self.file.write(LOG_RECORD.pack(step, self.clock() - self.start, kind, value))
+
+	def action(self, step, next_action):
+		if next_action[0] == "activate":
+			self.write(step, LOG_ACTIVATE, next_action[1])
+		elif next_action[0] == "move":
+			self.write(step, LOG_LEFT if next_action[1] == "left" else LOG_RIGHT)
+		else:
+			self.write(step, LOG_SHOOT)
+
+	def speed(self, step, timeleft):
+		self.write(step, LOG_SPEED, round(timeleft * 1000))
+
+	def close(self, step):
+		self.write(step, LOG_END)
+		self.file.close()
+
+def read_session(path):
+	# returns the header as dict and the records as (step, seconds, kind, value) tuples
+	with open(path, "rb") as log:
+		data = log.read()
+	magic, version, num_ships, sky_height, num_missiles, timeleft, seed, solvable = LOG_HEADER.unpack_from(data)
+	if magic != LOG_MAGIC or version != LOG_VERSION:
+		raise ValueError(f"{path} is no session log of version {LOG_VERSION}")
+	header = {"num_ships": num_ships, "sky_height": sky_height, "num_missiles": num_missiles, "timeleft": timeleft, "seed": seed, "solvable": solvable}
+	records = list(LOG_RECORD.iter_unpack(data[LOG_HEADER.size:]))
+	return header, records
+
+def replay(path, speed=0):
+	# re-run a session log without a terminal, as fast as possible or sleeping speed times the timeleft per step
+	header, records = read_session(path)
+	engine = GameEngine(header["num_ships"], header["sky_height"], header["num_missiles"], header["seed"], header["solvable"])
+	timeleft = header["timeleft"]
+	actions = {}
+	speeds = {}
+	end = 0
+	for step, _, kind, value in records:
+		if kind == LOG_ACTIVATE:
+			actions[step] = activate(value)
+		elif kind == LOG_LEFT:
+			actions[step] = ("move", "left", "move <")
+		elif kind == LOG_RIGHT:
+			actions[step] = ("move", "right", "move >")
+		elif kind == LOG_SHOOT:
+			actions[step] = ("shoot", "", "fire *")
+		elif kind == LOG_SPEED:
+			speeds[step] = value / 1000
+		else:
+			end = step
+	for step in range(end):
+		timeleft = speeds.get(step, timeleft)
+		if speed:
+			time.sleep(max(0, timeleft * speed))
+		if engine.done:
+			engine.reset()
+		engine.step(actions.get(step, ()))
+	return engine.stats, engine.final_stats
+
+# a snapshot is a header of fixed size followed by the ships, the alien queue, the shots and the state of the random
+# number generator, its size follows from the header so that snapshots appended to one file can be scanned in bulk
+SNAPSHOT_MAGIC = b"ASHS"
+SNAPSHOT_VERSION = 3
+# magic, version, ships, sky height, missiles, timeleft, wins, losses, destroyed, final stats (5 pairs), ship pos, base, lifetime,
+# shots (pos -1 if none), enemy pos_x, pos_y (pos_x -1 if none), number of shots, number of aliens queued, rng version (0 if none), gauss_next,
+# round over, round won
+SNAPSHOT_HEADER = struct.Struct("<4sBIIIdIII10IiiiiiiIIBd??")
+SNAPSHOT_RNG = struct.Struct("<625I")
+SHIP_STATES = ("inactive", "active", "wracked")
+SHIP_CODES = {state: code for code, state in enumerate(SHIP_STATES)}
+
+def snapshot(ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, timeleft, sky_height, num_missiles, rng=None, done=False, won=False):
+	# the full state of a game as bytes (rng is a random.Random to continue the following rounds with, done and won
+	# tell a round that is over, as its state does not tell every loss)
+	rng_state = rng.getstate() if rng else (0, None, None)
+	header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(ships), sky_height, num_missiles, timeleft,
+		stats["wins"], stats["losses"], stats["destroyed"], *(value for values in final_stats.values() for value in values),
+		active_ship["pos"] if active_ship else -1, active_ship["base"] if active_ship else -1,
+		active_ship["lifetime"] if active_ship else 0, active_ship["shots"] if active_ship else 0,
+		active_enemy["pos_x"] if active_enemy else -1, active_enemy["pos_y"] if active_enemy else 0,
+		len(active_shots), len(enemy_appearance), rng_state[0], math.nan if rng_state[2] is None else rng_state[2], done, won)
+	parts = [header, bytes(SHIP_CODES[ship] for ship in ships), struct.pack(f"<{len(enemy_appearance)}I", *enemy_appearance),
+		struct.pack(f"<{2 * len(active_shots)}i", *(value for shot in active_shots for value in (shot["pos_x"], shot["pos_y"])))]
+	if rng:
+		parts.append(SNAPSHOT_RNG.pack(*rng_state[1]))
+	return b"".join(parts)
+
+def unpack_snapshot_header(data, offset=0):
+	# the values of the header of the snapshot at offset of data (bytes, mmap or anything else supporting the buffer
+	# protocol) and the size of the whole snapshot
+	values = SNAPSHOT_HEADER.unpack_from(data, offset)
+	if values[0] != SNAPSHOT_MAGIC or values[1] != SNAPSHOT_VERSION:
+		raise ValueError(f"no snapshot of version {SNAPSHOT_VERSION} at offset {offset}")
+	num_ships = values[2]
+	num_shots, num_queued, rng_version = values[25:28]
+	return values, SNAPSHOT_HEADER.size + num_ships + 4 * num_queued + 8 * num_shots + (SNAPSHOT_RNG.size if rng_version else 0)
+
+def restore(data, offset=0):
+	# the game state of a snapshot as dict of new objects named like the arguments of snapshot
+	values, _ = unpack_snapshot_header(data, offset)
+	num_ships, sky_height, num_missiles, timeleft, wins, losses, destroyed = values[2:9]
+	final_stats = new_final_stats()
+	for i, key in enumerate(final_stats):
+		final_stats[key] = [values[9 + 2*i], values[10 + 2*i]]
+	pos, base, lifetime, shots, enemy_x, enemy_y, num_shots, num_queued, rng_version, gauss_next, done, won = values[19:]
+	offset += SNAPSHOT_HEADER.size
+	ships = [SHIP_STATES[code] for code in data[offset:offset + num_ships]]
+	offset += num_ships
+	enemy_appearance = list(struct.unpack_from(f"<{num_queued}I", data, offset))
+	offset += 4 * num_queued
+	shot_values = struct.unpack_from(f"<{2 * num_shots}i", data, offset)
+	offset += 8 * num_shots
+	rng = None
+	if rng_version:
+		rng = random.Random()
+		rng.setstate((rng_version, SNAPSHOT_RNG.unpack_from(data, offset), None if math.isnan(gauss_next) else gauss_next))
+	return {
+		"ships": ships,
+		"enemy_appearance": enemy_appearance,
+		"active_ship": {"pos": pos, "lifetime": lifetime, "base": base, "shots": shots} if pos >= 0 else {},
+		"active_enemy": {"pos_x": enemy_x, "pos_y": enemy_y} if enemy_x >= 0 else {},
+		"active_shots": [{"pos_x": shot_values[i], "pos_y": shot_values[i + 1]} for i in range(0, len(shot_values), 2)],
+		"stats": {"wins": wins, "losses": losses, "destroyed": destroyed},
+		"final_stats": final_stats,
+		"timeleft": timeleft,
+		"sky_height": sky_height,
+		"num_missiles": num_missiles,
+		"rng": rng,
+		"done": done,
+		"won": won,
+	}
+
+def scan_snapshots(path):
+	# the offset and the configuration and stats of each snapshot in a file of snapshots, only reading the headers
+	# through a memory map
+	if not os.path.getsize(path):
+		return
+	with open(path, "rb") as snapshots, mmap.mmap(snapshots.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		offset = 0
+		while offset < len(data):
+			values, size = unpack_snapshot_header(data, offset)
+			yield offset, {"num_ships": values[2], "sky_height": values[3], "num_missiles": values[4], "timeleft": values[5],
+				"wins": values[6], "losses": values[7], "destroyed": values[8]}
+			offset += size
+
+class Histogram:
+	"""Counts durations in power of two buckets of microseconds (bucket i holds durations below 2**i us)."""
+	__slots__ = ("buckets", "count", "total", "max")
+
+	def __init__(self):
+		self.buckets = [0] * 32
+		self.count = 0
+		self.total = 0
+		self.max = 0
+
+	def add(self, seconds):
+		us = int(seconds * 1e6)
+		self.buckets[min(us.bit_length(), 31)] += 1
+		self.count += 1
+		self.total += seconds
+		if seconds > self.max:
+			self.max = seconds
+
+	def percentile(self, fraction):
+		# the upper bound of the bucket holding the percentile in seconds
+		rank = fraction * self.count
+		seen = 0
+		for i, count in enumerate(self.buckets):
+			seen += count
+			if count and seen >= rank:
+				return (1 << i) / 1e6
+		return 0
+
+	def summary(self):
+		return {
+			"count": self.count,
+			"mean_us": self.total / self.count * 1e6 if self.count else 0,
+			"p50_us": self.percentile(0.5) * 1e6,
+			"p99_us": self.percentile(0.99) * 1e6,
+			"max_us": self.max * 1e6,
+			"buckets": {f"<{1 << i}us": count for i, count in enumerate(self.buckets) if count},
+		}
+
+class FrameProfiler:
+	"""Opt-in timing of the game loop: the time per stage, the latency from a key to the first frame showing its
+	action, the lateness of game steps against the countdown and the actions overwritten before their step.
+
+	The histograms are written as json to path on close() and whenever the game receives SIGUSR1, close() gives
+	the signal back to the handler it had before.
+	"""
+	STAGES = ("process_input", "update_state", "assist", "bot", "update_world", "draw", "refresh")
+
+	def __init__(self, path):
+		self.path = path
+		self.stages = {stage: Histogram() for stage in self.STAGES}
+		self.latency = Histogram()
+		self.lateness = Histogram()
+		self.keys = 0
+		self.overwritten = 0
+		self.key_time = None
+		self.previous_handler = None
+		if hasattr(signal, "SIGUSR1"):
+			self.previous_handler = signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+
+	def key(self, key_time, last_action):
+		# a key changed the next action, it is shown with the next drawn frame
+		self.keys += 1
+		if last_action:
+			self.overwritten += 1
+		if self.key_time is None:
+			self.key_time = key_time
+
+	def shown(self, frame_time):
+		if self.key_time is not None:
+			self.latency.add(frame_time - self.key_time)
+			self.key_time = None
+
+	def summary(self):
+		return {
+			"stages": {stage: histogram.summary() for stage, histogram in self.stages.items()},
+			"key_to_frame": self.latency.summary(),
+			"step_lateness": self.lateness.summary(),
+			"keys": self.keys,
+			"overwritten_actions": self.overwritten,
+		}
+
+	def dump(self):
+		with open(self.path, "w") as profile_file:
+			json.dump(self.summary(), profile_file, indent=1)
+
+	def close(self):
+		self.dump()
+		if self.previous_handler is not None:
+			signal.signal(signal.SIGUSR1, self.previous_handler)
+			self.previous_handler = None
+
+# the share of the countdown the assist may spend on planning the next action
+ASSIST_SHARE = 0.2
+
+class TickScheduler:
+	"""Times the game steps by absolute deadlines, so the lateness of one step does not delay the following ones.
+
+	A step that is late by less than catch_up intervals is made up for by the next ones, further behind (e.g. after
+	the process was suspended) the deadlines start over from now. The countdown is divided into five parts.
+	"""
+
+	def __init__(self, interval, clock=time.perf_counter, catch_up=3):
+		self.clock = clock
+		self.catch_up = catch_up
+		self.interval = max(interval, MIN_TIMELEFT)
+		self.restart()
+
+	def restart(self):
+		# start counting down from now, e.g. after a pause
+		self.last = self.clock()
+		self.deadline = self.last + self.interval
+
+	def set_interval(self, interval):
+		# keep the current countdown but end it after the new interval
+		self.interval = max(interval, MIN_TIMELEFT)
+		self.deadline = self.last + self.interval
+
+	def due(self, now):
+		return now >= self.deadline
+
+	def advance(self, now):
+		# call after the step that was due, returns how late it was
+		lateness = now - self.deadline
+		self.last = self.deadline
+		self.deadline += self.interval
+		if lateness > self.interval * self.catch_up:
+			self.last = now
+			self.deadline = now + self.interval
+		return lateness
+
+	def countdown(self, now):
+		# the number of countdown parts left (5 right after a step, 1 right before the next)
+		return min(5, max(1, math.ceil((self.deadline - now) / (self.interval/5))))
+
+	def timeout(self, now):
+		# the milliseconds until the countdown changes next (at least one while the step is not due, as rounding at the
+		# boundary of a part would leave nothing to wait for)
+		part = self.interval/5
+		left = self.deadline - now
+		return max(1, math.ceil((left - (math.ceil(left / part) - 1) * part) * 1000)) if left > 0 else 0
+
+def show_score(stdscr, stats, final_stats):
+	stdscr.clear()
+	stdscr.addstr(0, 0, "Thanks for playing Alien Shower.")
+	stdscr.addstr(2, 0, "Your final score:")
+	stdscr.addstr(4, 0, "Triumphs:")
+	stdscr.addstr(4, 32, f"{stats['wins']}")
+	stdscr.addstr(5, 0, "Losses:")
+	stdscr.addstr(5, 32, f"{stats['losses']}")
+	row = 6
+	for key in final_stats:
+		row += 1
+		stdscr.addstr(row, 0, f"Total {key}:")
+		stdscr.addstr(row, 32, f"{final_stats[key][0]} of {final_stats[key][1]}")
+	stdscr.addstr(row + 2, 0, "(Press any key to quit)", A_ITALIC)
+
+def wait_for_start(stdscr, world, color=0):
+	stdscr.clear()
+	draw_world(stdscr, world, color)
+	return wait_for_key(stdscr, (10, 27)) == 27
+
+def game(stdscr, num_ships, sky_height, num_missiles, timeleft, no_help, solvable=False, record=None, profile=None, broadcast=None, assist=False, wave=0, suspend=None, bot=None, clock=time, seed=None):
+	# the clock is anything with the perf_counter and sleep of the time module (e.g. a virtual one to run the game
+	# as fast as it can against a scripted screen), the seed makes the rounds the same on each run
+	# show as much of the board as fits into the terminal (at most the ten ships the number keys can activate)
 	# as curses crashes with an error if the cursor moves out of the screen
-	scr_height, _ = stdscr.getmaxyx()
-	if scr_height < sky_height + 15:
-		raise argparse.ArgumentTypeError(f"argument --sky: invalid size: {sky_height} (must fit into your terminal, either resize it's height or reduce the sky_height to a maximum of {scr_height - 15})")
+	scr_height, scr_width = stdscr.getmaxyx()
+	if scr_height < 16:
+		raise argparse.ArgumentTypeError(f"terminal too small: {scr_height} rows (must have at least 16 rows to show the sky, resize it's height)")
+	if scr_width < 3:
+		raise argparse.ArgumentTypeError(f"terminal too small: {scr_width} columns (must have at least 3 columns to show a ship, resize its width)")
+	view = (min(10, (scr_width + 1)//4), scr_height - 15)
+	# continue the round suspended to the file (its configuration overwriting the given one)
+	resumed = None
+	if suspend and os.path.exists(suspend):
+		with open(suspend, "rb") as suspended:
+			resumed = restore(suspended.read())
+		num_ships = len(resumed["ships"])
+		sky_height = resumed["sky_height"]
+		num_missiles = resumed["num_missiles"]
+		timeleft = resumed["timeleft"]
 	# init game state
-	stats = {"wins": 0, "losses": 0, "destroyed": 0}
-	final_stats = {
-		"aliens destroyed": [0, 0],
-		"moves made": [0, 0],
-		"missed defence": [0, 0],
-		"missed shots": [0, 0],
-		"ships lifetime expired": [0, 0]
-	}
-	sky_height = max(sky_height, num_ships-1, num_missiles) # adjust sky height to minimum to be able to win
-	ships, enemy_appearance, world = init_game(num_ships, sky_height, num_missiles)
-	# don't wait for input (while showing a black input screen)
-	stdscr.nodelay(True)
-	# hide cursor
-	curses.curs_set(0)
-	# use colors as used per default in the terminal
-	curses.use_default_colors()
-	curses.init_pair(1, curses.COLOR_RED, curses.COLOR_BLACK)
-	curses.init_pair(2, curses.COLOR_GREEN, curses.COLOR_BLACK)
+	stats = resumed["stats"] if resumed else {"wins": 0, "losses": 0, "destroyed": 0}
+	final_stats = resumed["final_stats"] if resumed else new_final_stats()
+	sky_height = winnable_sky_height(num_ships, sky_height, num_missiles)
+	timeleft = max(timeleft, MIN_TIMELEFT)
+	# seed the rounds to be able to replay the session
+	if seed is None:
+		seed = random.randrange(2**64)
+	rng = resumed["rng"] if resumed and resumed["rng"] else random.Random(seed)
+	perf_counter = clock.perf_counter
+	recorder = SessionRecorder(record, num_ships, sky_height, num_missiles, timeleft, seed, solvable, perf_counter) if record else None
+	profiler = FrameProfiler(profile) if profile else None
+	spectators = None
+	if broadcast:
+		# imported here as the broadcast draws with the functions of the game
+		import alien_broadcast
+		spectators = alien_broadcast.Broadcaster(broadcast, scr_height, scr_width)
+	step = 0
+	active_ship = {}
+	active_enemy = {}
+	active_shots = []
+	feedback = " " * 20 + "\n" + " " * 20
+	if not resumed:
+		ships, enemy_appearance, world, feedback = init_game(num_ships, sky_height, num_missiles, stats["wins"], stats["losses"], feedback, solvable, rng, view)
+	else:
+		# only the world is new, the fleet of the round is restored and the random number generator continues as saved
+		world = init_world(num_ships, sky_height, stats["wins"], stats["losses"], view=view)
+		ships = resumed["ships"]
+		enemy_appearance = resumed["enemy_appearance"]
+		active_ship = resumed["active_ship"]
+		active_enemy = resumed["active_enemy"]
+		active_shots = resumed["active_shots"]
+		update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, 5, " " * 20 + "\n" + " " * 20, "wait  ", view)
+	# the number keys activate ships counted from the first column shown on boards wider than the viewport
+	columns = view_size(num_ships, sky_height, view)[0]
+	scrolling = columns < num_ships
 	# show help and initial world and wait for user input (any key) to start
 	if not no_help:
 		show_help(stdscr, num_missiles, num_ships)
-	wait_for_start(stdscr, game_snapshot(num_ships, sky_height, num_missiles, ships))
+	wait_for_start(stdscr, game_snapshot(num_ships, sky_height, num_missiles, ships, view))
 	stdscr.clear()
 	draw_world(stdscr, world)
 	stdscr.refresh()
-	time.sleep(timeleft)
+	if spectators:
+		spectators.draw(world)
+	clock.sleep(timeleft)
 	# game loop
 	stdscr.clear()
+	renderer = WorldRenderer()
 	in_game = True
 	new_game = False
-	feedback = " " * 20 + "\n" + " " * 20
-	active_ship = {}
-	active_enemy = {}
-	active_shots = []
 	next_action = ()
-	clock = time.perf_counter()
-	delta_t = 0
+	# the action suggested by the assist for the current step (None until planned)
+	planner = alien_solver.Planner(num_ships, sky_height, num_missiles) if assist else None
+	hint = None
+	if wave:
+		# imported here as the wave mode builds on the rules of the game
+		import alien_wave
+		aliens = alien_wave.Wave(wave)
+	enemies = None
+	# the bot playing instead of the action keys is handed each step once (again from the start of a new round)
+	player = None
+	if bot:
+		# imported here as the bot plays with the functions of the game
+		import alien_bot
+		player = alien_bot.BotPlayer(bot, num_ships, num_missiles, seed)
+	published = False
+	new_round = True
+	scheduler = TickScheduler(timeleft, perf_counter)
 	while in_game:
+		# sleep until the next key or the next step of the countdown (the last step being the next game step), then
+		# take all keys that queued up meanwhile, however long the frame took
+		keys = read_keys(stdscr, scheduler.timeout(perf_counter()), perf_counter)
+		if player:
+			# the bot chooses the actions, the keys only leave or change the speed
+			keys = [key for key in keys if key[0] in (27, 43, 45)]
 		# process input
-		in_game, next_action, timeleft, feedback = process_input(stdscr.getch(), active_ship, ships, next_action, timeleft, feedback)
+		last_action = next_action
+		last_timeleft = timeleft
+		if profiler:
+			start = perf_counter()
+		in_game, next_action, timeleft, feedback = process_keys([key for key, _ in keys], active_ship, ships, next_action, timeleft, feedback, world.origin[0] if scrolling else None, columns)
+		if player:
+			# the answer of the bot if it came in time, else wait
+			next_action = player.poll(active_ship, ships) or ()
+			if not player.alive():
+				# the keys play on once the worker of the bot died
+				player.close()
+				player = None
+				feedback = "bot worker died     " + "\n" + "the keys play now   "
+		if profiler:
+			profiler.stages["process_input"].add(perf_counter() - start)
+			if next_action != last_action:
+				# the latency counts from the first key read for the frame
+				profiler.key(keys[0][1] if keys else start, last_action)
+		if recorder and next_action != last_action:
+			recorder.action(step, next_action)
+		if timeleft != last_timeleft:
+			scheduler.set_interval(timeleft)
+			if recorder:
+				recorder.speed(step, timeleft)
 		# update game state on next step
-		if delta_t >= timeleft:
+		now = perf_counter()
+		if scheduler.due(now):
+			lateness = scheduler.advance(now)
+			if profiler:
+				profiler.lateness.add(lateness)
+				start = perf_counter()
 			# update state
-			new_game, feedback = update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+			if wave:
+				new_game, feedback = alien_wave.update_wave(active_ship, aliens, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+			else:
+				new_game, feedback = update_state(active_ship, active_enemy, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+			step += 1
+			if profiler:
+				profiler.stages["update_state"].add(perf_counter() - start)
 			# clear action
 			next_action = ()
-			# renew clock
-			clock = time.perf_counter()
-		# time next step
-		delta_t = time.perf_counter() - clock
+			hint = None
+			published = False
+		if player and not published and not new_game:
+			if profiler:
+				start = perf_counter()
+			player.publish(ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, timeleft, sky_height, num_missiles, new_round)
+			published = True
+			new_round = False
+			if profiler:
+				profiler.stages["bot"].add(perf_counter() - start)
+		if profiler:
+			start = perf_counter()
+		# draw all aliens of a wave, following the lowest one
+		if wave:
+			enemies = aliens.enemies()
+			active_enemy = enemies[0] if enemies else {}
 		# update the world
-		update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, 5-int(delta_t/(timeleft/5)), feedback, next_action[2] if next_action else "wait  ")
-		# draw the world
-		draw_world(stdscr, world)
-		stdscr.refresh()
+		update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, scheduler.countdown(perf_counter()), feedback,
+			next_action[2] if next_action else "wait  ", view, (hint[2] if hint else "wait  ") if planner else None, enemies)
+		if profiler:
+			profiler.stages["update_world"].add(perf_counter() - start)
+			start = perf_counter()
+		# draw the world (only the changed rows)
+		if renderer.draw(stdscr, world):
+			if profiler:
+				profiler.stages["draw"].add(perf_counter() - start)
+				start = perf_counter()
+			stdscr.refresh()
+			if profiler:
+				end = perf_counter()
+				profiler.stages["refresh"].add(end - start)
+				profiler.shown(end)
+			if spectators:
+				spectators.draw(world)
+		# plan the suggestion for the step once the step is shown, within a share of the countdown, and show it
+		if planner and hint is None and not new_game:
+			if profiler:
+				start = perf_counter()
+			state = GameState.from_round(sky_height, num_missiles, ships, active_ship, active_enemy, active_shots, enemy_appearance)
+			# the planner spends real time, whatever the clock of the game
+			hint = planner.suggest(state, time.perf_counter() + timeleft * ASSIST_SHARE)
+			if profiler:
+				profiler.stages["assist"].add(perf_counter() - start)
+			update_world(world, sky_height, active_ship, active_enemy, active_shots, ships, enemy_appearance, stats, scheduler.countdown(perf_counter()), feedback,
+				next_action[2] if next_action else "wait  ", view, hint[2])
+			if renderer.draw(stdscr, world):
+				stdscr.refresh()
+				if spectators:
+					spectators.draw(world)
 		# check for new game
 		if new_game:
 			new_game = False
 			active_ship = {}
 			active_enemy = {}
 			active_shots = []
-			if wait_for_start(stdscr, world, 2 if "all aliens destroyed" in feedback else 1):
+			color = 2 if "all aliens destroyed" in feedback else 1
+			if spectators:
+				spectators.draw(world, color)
+			if wait_for_start(stdscr, world, color):
 				break
 			feedback=" " * 20 + "\n" + " " * 20
-			ships, enemy_appearance, world = init_game(num_ships, sky_height, num_missiles, stats["wins"], stats["losses"], feedback)
-			# draw the initial world
-			draw_world(stdscr, world)
+			ships, enemy_appearance, world, feedback = init_game(num_ships, sky_height, num_missiles, stats["wins"], stats["losses"], feedback, solvable, rng, view)
+			# draw the initial world (on the screen cleared by wait_for_start)
+			renderer.invalidate()
+			renderer.draw(stdscr, world)
 			stdscr.refresh()
+			if spectators:
+				spectators.clear()
+				spectators.draw(world)
 			stats["destroyed"] = 0
-			clock = time.perf_counter()
-			delta_t = 0
+			hint = None
+			published = False
+			new_round = True
+			if wave:
+				aliens = alien_wave.Wave(wave)
+			scheduler.restart()
+	if player:
+		player.close()
+	if recorder:
+		recorder.close(step)
+	if profiler:
+		profiler.close()
+	if suspend:
+		# save the round left with escape, a finished round leaves nothing to continue
+		if not in_game:
+			with open(suspend, "wb") as suspended:
+				suspended.write(snapshot(ships, enemy_appearance, active_ship, active_enemy, active_shots, stats, final_stats, timeleft, sky_height, num_missiles, rng))
+		elif os.path.exists(suspend):
+			os.remove(suspend)
 	# show goodbye screen
-	stdscr.clear()
-	while stdscr.getch() == -1:
-		stdscr.addstr(0, 0, "Thanks for playing Alien Shower.")
-		stdscr.addstr(2, 0, "Your final score:")
-		stdscr.addstr(4, 0, "Triumphs:")
-		stdscr.addstr(4, 32, f"{stats['wins']}")
-		stdscr.addstr(5, 0, "Losses:")
-		stdscr.addstr(5, 32, f"{stats['losses']}")
-		row = 6
-		for key in final_stats:
-			row += 1
-			stdscr.addstr(row, 0, f"Total {key}:")
-			stdscr.addstr(row, 32, f"{final_stats[key][0]} of {final_stats[key][1]}")
-		stdscr.addstr(row + 2, 0, "(Press any key to quit)", curses.A_ITALIC)
-		stdscr.refresh()
-
-def run(difficulty="custom", num_ships=5, sky_height=4, num_missiles=2, speed=1, no_help=False):
-	if num_ships < 2 or num_ships > 10:
-		raise argparse.ArgumentTypeError(f"argument --ships: invalid choice: {num_ships} (choose from 2, 3, 4, 5, 6, 7, 8, 9, 10)")
+	show_score(stdscr, stats, final_stats)
+	stdscr.refresh()
+	if spectators:
+		show_score(spectators.screen, stats, final_stats)
+		spectators.publish()
+		spectators.close()
+	# wait for any key
+	stdscr.timeout(-1)
+	stdscr.getch()
+	return stats, final_stats
+
+# predefined (num_ships, sky_height, num_missiles, speed) per difficulty
+DIFFICULTIES = {
+	"easy": (5, 8, 2, 1),
+	"normal": (5, 4, 2, 1),
+	"hard": (10, 4, 2, 0.5), # sky height will be overwritten
+	"brainfuck": (10, 4, 3, 0.3), # sky height will be overwritten
+}
+
+def run(difficulty="custom", num_ships=5, sky_height=4, num_missiles=2, speed=1, no_help=False, solvable=False, record=None, profile=None, win_rate=None, broadcast=None, backend="curses", assist=False, wave=0, suspend=None, bot=None):
+	if num_ships < 2:
+		raise argparse.ArgumentTypeError(f"argument --ships: invalid choice: {num_ships} (must be at least 2)")
 	if num_missiles < 1:
 		raise argparse.ArgumentTypeError(f"argument --missiles: invalid choice: {num_missiles} (must be larger than 0)")
-	if difficulty == "easy":
-		num_ships=5
-		sky_height=8
-		num_missiles=2
-		speed=1
-	if difficulty == "normal":
-		num_ships=5
-		sky_height=4
-		num_missiles=2
-		speed=1
-	if difficulty == "hard":
-		num_ships=10
-		sky_height=4 # will be overwritten
-		num_missiles=2
-		speed=0.5
-	if difficulty == "brainfuck":
-		num_ships=10
-		sky_height=4 # will be overwritten
-		num_missiles=3
-		speed=0.3
-	curses.wrapper(game, num_ships, sky_height, num_missiles, speed, no_help)
+	if wave < 0:
+		raise argparse.ArgumentTypeError(f"argument --wave: invalid choice: {wave} (must be at least 0)")
+	if wave and (record or assist or solvable):
+		raise argparse.ArgumentTypeError("argument --wave: not allowed with --record, --assist or --solvable (they follow the rules of one alien at a time)")
+	if bot:
+		if wave:
+			raise argparse.ArgumentTypeError("argument --bot: not allowed with --wave (bots play by the rules of one alien at a time)")
+		# imported here as the bots are defined with the tournament
+		import alien_tournament
+		try:
+			alien_tournament.load_bot(bot)
+		except ValueError as error:
+			raise argparse.ArgumentTypeError(f"argument --bot: {error}")
+	if broadcast:
+		# imported here as the broadcast draws with the functions of the game
+		import alien_broadcast
+		try:
+			alien_broadcast.stale_socket(broadcast)
+		except ValueError as error:
+			raise argparse.ArgumentTypeError(f"argument --broadcast: {error}")
+	if suspend and (record or wave):
+		raise argparse.ArgumentTypeError("argument --suspend: not allowed with --record or --wave (a resumed round cannot be replayed from its seed, the aliens of a wave are not saved)")
+	if difficulty in DIFFICULTIES:
+		num_ships, sky_height, num_missiles, speed = DIFFICULTIES[difficulty]
+	if win_rate is not None:
+		# imported here as the calibration plays the game itself
+		import alien_calibrate
+		config = alien_calibrate.Calibration().suggest(win_rate)
+		if config is None:
+			raise argparse.ArgumentTypeError("argument --win_rate: no calibrated configurations (run alien_calibrate.py first)")
+		num_ships, sky_height, num_missiles, speed = config
+	if backend == "null":
+		# nobody could page through the help
+		no_help = True
+	alien_render.BACKENDS[backend](game, num_ships, sky_height, num_missiles, speed, no_help, solvable, record, profile, broadcast, assist, wave, suspend, bot)
 
 def main():
 	parser = argparse.ArgumentParser(description="A kind of round-based space invader tetris mix.")
 	parser.add_argument("--difficulty", choices=["easy", "normal", "hard", "brainfuck", "custom"], default="custom", metavar="", help="the difficulty which predefines the number of ships, sky height, missiles and speed and overwrites their values unless set to custom [easy: normal game with high sky, normal: normal game (challenging for beginners), hard: faster coundown and more ships, brainfuck: even faster countdown and more shots to make, custom: choose your own difficulty from super easy to inhuman by adjusting the parameters]")
-	parser.add_argument("--ships", choices=[2, 3, 4, 5, 6, 7, 8, 9, 10], type=int, default=5, metavar="[2, ..., 10]", help="the number of ships (will be overwritten unless the difficulty is set to custom)")
-	parser.add_argument("--sky", type=int, default=4, metavar="", help="the sky height (will be overwritten unless the difficulty is set to custom or if the game would be unplayable)")
+	parser.add_argument("--ships", type=int, default=5, metavar="[2, ...]", help="the number of ships, boards wider than the terminal or ten ships scroll and the number keys count from the first ship shown (will be overwritten unless the difficulty is set to custom)")
+	parser.add_argument("--sky", type=int, default=4, metavar="", help="the sky height, skies taller than the terminal scroll (will be overwritten unless the difficulty is set to custom or if the game would be unplayable)")
 	parser.add_argument("--missiles", type=int, default=2, metavar="", help="the number of missiles of each ship (will be overwritten unless the difficulty is set to custom)")
 	parser.add_argument("--speed", type=float, default=1.0, metavar="", help="the countdown for movement decisions and the amount of time enemies and bullets require to move in seconds (will be overwritten unless the difficulty is set to custom)")
 	parser.add_argument("--no_help", action="store_true", help="deactivate help")
+	parser.add_argument("--solvable", action="store_true", help="only play rounds that can be won (rounds for which the solver finds no such order within a few seconds are played as shuffled and say so)")
+	parser.add_argument("--record", metavar="FILE", help="record the session to replay it later")
+	parser.add_argument("--replay", nargs="+", metavar="FILE", help="replay recorded sessions without a terminal and print their scores")
+	parser.add_argument("--replay_speed", type=float, default=0, metavar="", help="the time per step of a replay as multiple of the recorded countdown (0 for as fast as possible)")
+	parser.add_argument("--win_rate", type=float, metavar="", help="play the calibrated configuration closest to this win rate of the reference player (overwrites the difficulty and its parameters, see alien_calibrate.py)")
+	parser.add_argument("--profile", metavar="FILE", help="time the game loop and write the histograms as json to this file at exit (and on SIGUSR1)")
+	parser.add_argument("--broadcast", metavar="PATH", help="let spectators watch the game on this Unix socket (see alien_broadcast.py)")
+	parser.add_argument("--assist", action="store_true", help="suggest the next action during play (planned ahead through the coming aliens within a fifth of the countdown)")
+	parser.add_argument("--wave", type=int, default=0, metavar="STEPS", help="let a new alien appear every STEPS steps, even while others are still falling (0 for one alien at a time)")
+	parser.add_argument("--suspend", metavar="FILE", help="save the round in play to this file when leaving with escape and continue it at the next start with this file (overwrites the difficulty and its parameters)")
+	parser.add_argument("--bot", metavar="BOT", help="let a bot play instead of the action keys, run in a worker process that has until each step to answer or the ship waits: random, greedy, solver or module:class (see alien_tournament.py)")
+	parser.add_argument("--backend", choices=list(alien_render.BACKENDS), default="curses", help="draw with curses, with ANSI escape sequences written once per frame or not at all (null plays one round without input, e.g. to profile it)")
 	args = parser.parse_args()
-	run(args.difficulty, args.ships, args.sky, args.missiles, args.speed, args.no_help)
+	if args.replay:
+		for path in args.replay:
+			stats, final_stats = replay(path, args.replay_speed)
+			print(f"{path}: wins: {stats['wins']}, losses: {stats['losses']}, " + ", ".join(f"{key}: {value[0]} of {value[1]}" for key, value in final_stats.items()))
+		return
+	run(args.difficulty, args.ships, args.sky, args.missiles, args.speed, args.no_help, args.solvable, args.record, args.profile, args.win_rate, args.broadcast, args.backend, args.assist, args.wave, args.suspend, args.bot)
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,115 @@
+##
+ # Run the game loop of Alien Shower on a virtual clock against scripted keys, as fast as it can.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import time
+import random
+import argparse
+import itertools
+
+import alien_shower
+from alien_render import NullScreen
+
+class VirtualClock:
+	"""Stands in for the time module: the time only passes when slept or waited for keys on a ScriptedScreen."""
+	__slots__ = ("now",)
+
+	def __init__(self, now=0.0):
+		self.now = now
+
+	def perf_counter(self):
+		return self.now
+
+	def sleep(self, seconds):
+		self.now += max(0, seconds)
+
+class ScriptedScreen(NullScreen):
+	"""Discards what is drawn and plays the keys of a script, each (seconds after the previous key, key code).
+
+	Waiting for a key moves the clock on to the next key of the script or to the end of the timeout (at least a
+	millisecond), whichever is first. Once the script is over the screen reads escape to leave.
+	"""
+	__slots__ = ("clock", "script", "next_key", "keys")
+
+	def __init__(self, script, clock, height=24, width=80):
+		super().__init__(height, width)
+		self.clock = clock
+		self.script = iter(script)
+		self.next_key = None
+		self.keys = 0
+		self.pull()
+
+	def pull(self):
+		# the time and code of the next key of the script
+		entry = next(self.script, None)
+		if entry is None:
+			self.next_key = None
+		else:
+			start = self.next_key[0] if self.next_key else self.clock.now
+			self.next_key = (start + entry[0], entry[1])
+
+	def getch(self):
+		clock = self.clock
+		if self.next_key is None:
+			return 27
+		at, key = self.next_key
+		# a timed wait passes at least a millisecond, so that the game cannot poll at a standstill
+		wait = max(self.delay, 1) / 1000
+		if self.delay >= 0 and at > clock.now + wait:
+			clock.now += wait
+			return -1
+		clock.now = max(clock.now, at)
+		self.keys += 1
+		self.pull()
+		return key
+
+# the keys of random play: ships, moves and shots, the returns start the next round
+KEYS = b"1234567890adsad\n"
+
+def random_script(rng, keys=KEYS, gap=0.5):
+	# endless random keys about gap seconds apart
+	while True:
+		yield rng.expovariate(1 / gap), rng.choice(keys)
+
+def soak(seconds, num_ships=5, sky_height=4, num_missiles=2, speed=1, seed=0, solvable=False, keys=KEYS, record=None):
+	# play seconds of virtual time of random keys (recording the session to record if given), returns the stats,
+	# final stats and the keys played
+	rng = random.Random(seed)
+	clock = VirtualClock()
+	script = random_script(rng, keys)
+	screen = ScriptedScreen(itertools.takewhile(lambda entry: clock.now < seconds, script), clock)
+	stats, final_stats = alien_shower.game(screen, num_ships, sky_height, num_missiles, speed, True, solvable, record, clock=clock, seed=seed)
+	return stats, final_stats, screen.keys
+
+def main():
+	parser = argparse.ArgumentParser(description="Play the full game loop on a virtual clock with random keys, as fast as it runs.")
+	parser.add_argument("--hours", type=float, default=1, help="the hours of virtual time to play")
+	parser.add_argument("--ships", type=int, default=5, help="the number of ships")
+	parser.add_argument("--sky", type=int, default=4, help="the sky height")
+	parser.add_argument("--missiles", type=int, default=2, help="the number of missiles of each ship")
+	parser.add_argument("--speed", type=float, default=1.0, help="the countdown in (virtual) seconds")
+	parser.add_argument("--seed", type=int, default=0, help="the seed of the keys and the rounds")
+	args = parser.parse_args()
+	start = time.perf_counter()
+	stats, final_stats, keys = soak(args.hours * 3600, args.ships, args.sky, args.missiles, args.speed, args.seed)
+	elapsed = time.perf_counter() - start
+	print(f"{args.hours:g}h of play in {elapsed:.1f}s: {stats['wins'] + stats['losses']} rounds, {keys} keys")
+	print(f"wins: {stats['wins']}, losses: {stats['losses']}, " + ", ".join(f"{key}: {value[0]} of {value[1]}" for key, value in final_stats.items()))
+
+if __name__ == "__main__":
+	main()
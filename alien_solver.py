@@ -0,0 +1,403 @@
+##
+ # Decide whether a round of Alien Shower can be won and find a winning plan.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import gc
+import sys
+import time
+import random
+import argparse
+import collections
+
+from alien_state import GameState, activate, unpack_shot, winnable_sky_height
+
+# actions as returned by process_input
+WAIT = ()
+LEFT = ("move", "left", "move <")
+RIGHT = ("move", "right", "move >")
+SHOOT = ("shoot", "", "fire *")
+
+def way(start, low, high):
+	# the shortest way from start over all columns between low and high
+	if start <= low:
+		return high - start
+	if start >= high:
+		return start - low
+	return high - low + min(start - low, high - start)
+
+class Restart(Exception):
+	pass
+
+class Solver:
+	"""Depth-first search over game states with a transposition table of lost states.
+
+	The search restarts with a growing budget of states, alternating between preferring the ship closest to the
+	next alien and the ship closest to all aliens it has to shoot. Lost states stay known between restarts.
+	"""
+
+	def __init__(self, num_ships, sky_height, num_missiles, max_nodes=None):
+		self.num_ships = num_ships
+		self.sky_height = winnable_sky_height(num_ships, sky_height, num_missiles)
+		self.num_missiles = num_missiles
+		self.max_nodes = max_nodes
+		self.nodes = 0
+		self.deadline = None
+		self.enemy_appearance = []
+		self.lost = {}
+		self.coverage = {}
+
+	def solve(self, enemy_appearance):
+		# returns a winning list of actions (one per game step) or None if the round cannot be won
+		return self.plan(GameState.new(self.num_ships, self.sky_height, self.num_missiles, enemy_appearance))
+
+	def plan(self, state, deadline=None, keep=False):
+		# the same from any state of a round, raises TimeoutError once time.perf_counter() passes the deadline
+		# (keep the known states to continue in the same round, they only hold for the same aliens)
+		if not keep:
+			self.enemy_appearance = list(state.queue)
+			self.lost = {}
+			self.coverage = {}
+		self.deadline = deadline
+		self.nodes = 0
+		recursion_limit = sys.getrecursionlimit()
+		sys.setrecursionlimit(max(recursion_limit, 4 * len(self.enemy_appearance) * (self.sky_height + 2) + 100))
+		budget = 1000
+		self.by_block = False
+		try:
+			while True:
+				plan = []
+				self.restart_at = self.nodes + budget
+				self.check_deadline()
+				try:
+					if self.search(state, plan):
+						plan.reverse()
+						return plan
+					return None
+				except Restart:
+					if self.by_block:
+						budget *= 4
+					self.by_block = not self.by_block
+		finally:
+			sys.setrecursionlimit(recursion_limit)
+
+	def search(self, state, plan):
+		lifetime = state.lifetime
+		enemy_y = state.enemy_y
+		# waiting turns a state into the same one with the alien and the shots moved on, so states are kept by what
+		# does not change when waiting and a state lost with some lifetime and alien position is lost with less
+		# lifetime and a lower alien as well (the ship's base is left out as it cannot be activated again anyway)
+		key = (state.inactive, state.pos, state.shots_left, state.enemy_x, tuple(shot + enemy_y for shot in state.shots), state.remaining)
+		lost = self.lost.get(key)
+		if lost and any(lost_lifetime >= lifetime and lost_enemy_y <= enemy_y for lost_lifetime, lost_enemy_y in lost):
+			return False
+		if not self.feasible(state):
+			return False
+		self.nodes += 1
+		if self.max_nodes and self.nodes > self.max_nodes:
+			raise TimeoutError(f"no decision within {self.max_nodes} states")
+		self.check_deadline()
+		if self.nodes > self.restart_at:
+			raise Restart()
+		for action in self.actions(state):
+			next_state = state.step(action)
+			if next_state is True or next_state and self.search(next_state, plan):
+				plan.append(action)
+				return True
+		self.lost.setdefault(key, []).append((lifetime, enemy_y))
+		return False
+
+	def check_deadline(self):
+		# the clock costs a fraction of a state, so it is looked at before each state and bound check
+		if self.deadline and time.perf_counter() > self.deadline:
+			raise TimeoutError("no decision in time")
+
+	def target(self, state):
+		# the column of the first alien which no shot in flight will hit
+		enemy_x = state.enemy_x
+		remaining = state.remaining
+		shift = state.shift
+		if enemy_x >= 0 and not any(shot >> shift == enemy_x and unpack_shot(shot, shift)[1] >= state.enemy_y for shot in state.shots):
+			return enemy_x, True
+		if remaining:
+			return self.enemy_appearance[remaining - 1], False
+		return None
+
+	def feasible(self, state):
+		inactive = state.inactive
+		pos = state.pos
+		shots_left = state.shots_left
+		enemy_x = state.enemy_x
+		enemy_y = state.enemy_y
+		remaining = state.remaining
+		# prune states with a shot that cannot hit anything, i.e. that is not below the alien on screen and does not
+		# share a column with any alien that may appear before the shot leaves the sky (at most one per step)
+		covered = False
+		for shot in state.shots:
+			pos_x, pos_y = unpack_shot(shot, state.shift)
+			if pos_x == enemy_x and pos_y >= enemy_y:
+				covered = True
+			elif pos_y < 0 or pos_x not in self.enemy_appearance[max(0, remaining - pos_y - 2):remaining]:
+				return False
+		if not self.coverable(state):
+			return False
+		# prune states in which the uncovered alien lands before any ship can hit it
+		if enemy_x < 0 or covered:
+			return True
+		# a shot has to be fired within the steps left until the alien lands, either by the active ship
+		# or by an inactive one after the active ship fired all of its shots
+		steps_left = self.sky_height - enemy_y
+		if pos >= 0:
+			distance = abs(pos - enemy_x)
+			if distance + 1 <= steps_left and distance < state.lifetime:
+				return True
+		lifetime = (self.num_ships*self.num_missiles)//2
+		for base in range(self.num_ships):
+			if inactive >> base & 1:
+				distance = abs(base - enemy_x)
+				if shots_left + distance + 2 <= steps_left and distance < lifetime:
+					return True
+		return False
+
+	def coverable(self, state):
+		# relaxation without time and order: the remaining aliens have to be split among the ships (and the shots
+		# in flight) so that each ship can visit the columns of its share within its lifetime
+		inactive = state.inactive
+		pos = state.pos
+		lifetime = state.lifetime
+		shots_left = state.shots_left
+		enemy_x = state.enemy_x
+		remaining = state.remaining
+		key = (inactive, pos, lifetime, shots_left, enemy_x, tuple(shot >> state.shift for shot in state.shots), remaining)
+		if key in self.coverage:
+			return self.coverage[key]
+		# a shot in flight may only hit an alien in its column
+		columns = self.enemy_appearance[:remaining] + ([enemy_x] if enemy_x >= 0 else [])
+		for pos_x in key[5]:
+			if pos_x not in columns:
+				self.coverage[key] = False
+				return False
+			columns.remove(pos_x)
+		columns.sort()
+		self.check_deadline()
+		# ships as (start, moves, capacity)
+		ships = [(pos, lifetime - 1, shots_left)] if pos >= 0 else []
+		moves = (self.num_ships*self.num_missiles)//2 - 1
+		ships += [(base, moves, self.num_missiles) for base in range(self.num_ships) if inactive >> base & 1]
+		result = sum(ship[2] for ship in ships) == len(columns) and self.split(columns, ships)
+		self.coverage[key] = result
+		return result
+
+	def split(self, columns, ships, budget=256):
+		# assign the sorted columns one by one, a ship's share is kept as (lowest column, count) as the column
+		# to assign next is always its highest one (gives up and assumes a split exists after budget tries)
+		shares = [None] * len(ships)
+		failed = set()
+		tries = [budget]
+
+		def assign(i):
+			if i == len(columns):
+				return True
+			key = (i, tuple(shares))
+			if key in failed:
+				return False
+			tries[0] -= 1
+			if tries[0] < 0:
+				return True
+			if not tries[0] & 7:
+				self.check_deadline()
+			column = columns[i]
+			tried = set()
+			for j, (start, moves, capacity) in enumerate(ships):
+				share = shares[j]
+				if share and share[1] == capacity or (ships[j], share) in tried:
+					continue
+				tried.add((ships[j], share))
+				low = share[0] if share else column
+				if way(start, low, column) > moves:
+					continue
+				shares[j] = (low, share[1] + 1 if share else 1)
+				if assign(i + 1):
+					return True
+				shares[j] = share
+			failed.add(key)
+			return False
+
+		return assign(0)
+
+	def actions(self, state):
+		# legal actions, most promising first
+		inactive = state.inactive
+		pos = state.pos
+		shots_left = state.shots_left
+		remaining = state.remaining
+		goal, on_screen = self.target(state) or (pos, False)
+		if pos < 0:
+			bases = [base for base in range(self.num_ships) if inactive >> base & 1]
+			if self.by_block:
+				# a ship mostly fires its shots at the aliens that come next
+				upcoming = self.enemy_appearance[max(0, remaining - self.num_missiles + on_screen):remaining] + [goal]
+				low = min(upcoming)
+				high = max(upcoming)
+				bases.sort(key=lambda base: (way(base, low, high), abs(base - goal)))
+			else:
+				bases.sort(key=lambda base: abs(base - goal))
+			return [activate(base) for base in bases] + [WAIT]
+		actions = []
+		# shoot at aliens on screen at once, but wait for the next alien to come
+		if shots_left > 0 and pos == goal and on_screen:
+			actions.append(SHOOT)
+		if goal < pos:
+			actions.append(LEFT)
+		elif goal > pos:
+			actions.append(RIGHT)
+		actions.append(WAIT)
+		if pos > 0 and LEFT not in actions:
+			actions.append(LEFT)
+		if pos < self.num_ships - 1 and RIGHT not in actions:
+			actions.append(RIGHT)
+		if shots_left > 0 and SHOOT not in actions:
+			actions.append(SHOOT)
+		return actions
+
+class Planner:
+	"""Suggests the next action of a round in play within a deadline.
+
+	Winning plans are kept by the states along them in a bounded cache, so following a suggestion costs nothing in the
+	next step and the states the search ruled out stay known for the rest of the round. Without a plan in time (or if
+	the round cannot be won any more) the suggestion is to head for the next alien.
+	"""
+
+	def __init__(self, num_ships, sky_height, num_missiles, cache_size=4096):
+		self.solver = Solver(num_ships, sky_height, num_missiles)
+		self.cache = collections.OrderedDict()
+		self.cache_size = cache_size
+		self.queue = None
+		self.hits = 0
+		self.timeouts = 0
+
+	def remember(self, state, action):
+		# least recently used states are dropped first
+		self.cache[state] = action
+		self.cache.move_to_end(state)
+		if len(self.cache) > self.cache_size:
+			self.cache.popitem(last=False)
+
+	def suggest(self, state, deadline):
+		# the action to take next
+		# the aliens still to come are the start of the queue of the round (the game packs only those), anything
+		# else is a new round
+		remaining = state.remaining
+		if self.queue is None or tuple(state.queue[:remaining]) != self.queue[:remaining]:
+			self.queue = tuple(state.queue[:remaining])
+			self.solver.enemy_appearance = list(state.queue)
+			self.solver.lost = {}
+			self.solver.coverage = {}
+		if state in self.cache:
+			self.hits += 1
+			self.cache.move_to_end(state)
+			action = self.cache[state]
+			return action if action is not None else self.greedy(state)
+		# a collection of the many small objects of the search could take longer than the rest of the deadline, it
+		# runs once the suggestion is made
+		collecting = gc.isenabled()
+		gc.disable()
+		try:
+			plan = self.solver.plan(state, deadline, keep=True)
+		except TimeoutError:
+			self.timeouts += 1
+			return self.greedy(state)
+		finally:
+			if collecting:
+				gc.enable()
+		if plan is None:
+			self.remember(state, None)
+			return self.greedy(state)
+		action = plan[0]
+		# keep as much of the plan as the deadline allows, the rest is found again quickly from the known states
+		for i, step in enumerate(plan):
+			if not i & 7 and deadline is not None and time.perf_counter() > deadline:
+				break
+			self.remember(state, step)
+			state = state.step(step)
+		return action
+
+	def greedy(self, state):
+		# wake the ship closest to the next alien, move below it and shoot once it is on screen
+		target = self.solver.target(state)
+		if target is None:
+			return WAIT
+		goal, on_screen = target
+		if state.pos < 0:
+			bases = [base for base in range(self.solver.num_ships) if state.inactive >> base & 1]
+			return activate(min(bases, key=lambda base: abs(base - goal))) if bases else WAIT
+		if state.pos > goal:
+			return LEFT
+		if state.pos < goal:
+			return RIGHT
+		if on_screen and state.shots_left > 0:
+			return SHOOT
+		return WAIT
+
+def solve(num_ships, sky_height, num_missiles, enemy_appearance, max_nodes=None):
+	return Solver(num_ships, sky_height, num_missiles, max_nodes).solve(enemy_appearance)
+
+def is_solvable(num_ships, sky_height, num_missiles, enemy_appearance, max_nodes=None):
+	return solve(num_ships, sky_height, num_missiles, enemy_appearance, max_nodes) is not None
+
+def shuffle_solvable(enemy_appearance, num_ships, sky_height, num_missiles, rng=random, max_nodes=10000, budget=None):
+	# shuffle the aliens until the round can be won, searching at most max_nodes states per order and budget states
+	# in all, returns False if no order was found within (the aliens are left shuffled)
+	if budget is None:
+		# a state costs about the square of the number of ships, which keeps the search to a few seconds
+		budget = 20000000 // num_ships**2
+	solver = Solver(num_ships, sky_height, num_missiles)
+	for _ in range(100):
+		rng.shuffle(enemy_appearance)
+		solver.max_nodes = min(max_nodes, budget)
+		try:
+			if solver.solve(enemy_appearance) is not None:
+				return True
+		except TimeoutError:
+			pass
+		budget -= solver.nodes
+		if budget <= 0:
+			break
+	return False
+
+def main():
+	parser = argparse.ArgumentParser(description="Check how many random rounds of Alien Shower can be won.")
+	parser.add_argument("--ships", type=int, default=5, help="the number of ships")
+	parser.add_argument("--sky", type=int, default=4, help="the sky height")
+	parser.add_argument("--missiles", type=int, default=2, help="the number of missiles of each ship")
+	parser.add_argument("--rounds", type=int, default=100, help="the number of rounds to check")
+	parser.add_argument("--seed", type=int, default=None, help="the seed for shuffling the aliens")
+	args = parser.parse_args()
+	rng = random.Random(args.seed)
+	solver = Solver(args.ships, args.sky, args.missiles)
+	solvable = 0
+	nodes = 0
+	for _ in range(args.rounds):
+		enemy_appearance = list(range(args.ships)) * args.missiles
+		rng.shuffle(enemy_appearance)
+		if solver.solve(enemy_appearance) is not None:
+			solvable += 1
+		nodes += solver.nodes
+	print(f"solvable: {solvable} of {args.rounds} (searched {nodes} states)")
+
+if __name__ == "__main__":
+	main()
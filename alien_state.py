@@ -0,0 +1,198 @@
+##
+ # Compact, immutable game states of Alien Shower.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+def activate(value):
+	# the action waking the ship at value (-1 for the last one, as the key 0 does on a board of ten), labelled with the
+	# number of the ship for process_input, the bots and the assist alike
+	return ("activate", value, f"wake {value + 1}")
+
+def winnable_sky_height(num_ships, sky_height, num_missiles):
+	# the sky height adjusted to the minimum to be able to win, as every board is played
+	return max(sky_height, num_ships - 1, num_missiles)
+
+def shot_shift(sky_height):
+	# the bits of pos_y + 1 in a packed shot, one more than the sky needs so that an alien position can be added to
+	# it without reaching pos_x (as the solver does)
+	return (sky_height + 1).bit_length() + 1
+
+def pack_shot(pos_x, pos_y, shift):
+	# shots leave the sky at pos_y -1
+	return pos_x << shift | pos_y + 1
+
+def unpack_shot(shot, shift):
+	return shot >> shift, (shot & (1 << shift) - 1) - 1
+
+def pack_queue(enemy_appearance):
+	# the alien queue is shared by all states of a round
+	return bytes(enemy_appearance) if max(enemy_appearance, default=0) < 256 else tuple(enemy_appearance)
+
+class GameState:
+	"""A round as small integers: ship states as bit masks, the active ship (pos -1 if none), the alien (enemy_x -1
+	if none), the shots as packed integers in firing order (pos_x above the lowest shift bits) and the alien queue
+	(shared, next alien at remaining - 1).
+
+	States are immutable, so copying is free, and hash and compare by value. step() follows the rules of update_state.
+	"""
+	__slots__ = ("rules", "shift", "inactive", "wracked", "pos", "base", "lifetime", "shots_left", "enemy_x", "enemy_y", "shots", "queue", "remaining", "_hash")
+
+	def __init__(self, rules, shift, inactive, wracked, pos, base, lifetime, shots_left, enemy_x, enemy_y, shots, queue, remaining):
+		# rules are (num_ships, sky_height, num_missiles), shift is the shot_shift of the sky height
+		self.rules = rules
+		self.shift = shift
+		self.inactive = inactive
+		self.wracked = wracked
+		self.pos = pos
+		self.base = base
+		self.lifetime = lifetime
+		self.shots_left = shots_left
+		self.enemy_x = enemy_x
+		self.enemy_y = enemy_y
+		self.shots = shots
+		self.queue = queue
+		self.remaining = remaining
+		self._hash = None
+
+	@classmethod
+	def new(cls, num_ships, sky_height, num_missiles, enemy_appearance):
+		# the state at the start of a round
+		return cls((num_ships, sky_height, num_missiles), shot_shift(sky_height), (1 << num_ships) - 1, 0, -1, -1, 0, 0, -1, 0, (), pack_queue(enemy_appearance), len(enemy_appearance))
+
+	@classmethod
+	def from_round(cls, sky_height, num_missiles, ships, active_ship, active_enemy, active_shots, enemy_appearance):
+		# pack the dicts and lists used by update_state
+		inactive = 0
+		wracked = 0
+		for i, ship in enumerate(ships):
+			if ship == "inactive":
+				inactive |= 1 << i
+			elif ship == "wracked":
+				wracked |= 1 << i
+		shift = shot_shift(sky_height)
+		return cls((len(ships), sky_height, num_missiles), shift, inactive, wracked,
+			active_ship["pos"] if active_ship else -1, active_ship["base"] if active_ship else -1,
+			active_ship["lifetime"] if active_ship else 0, active_ship["shots"] if active_ship else 0,
+			active_enemy["pos_x"] if active_enemy else -1, active_enemy["pos_y"] if active_enemy else 0,
+			tuple(pack_shot(shot["pos_x"], shot["pos_y"], shift) for shot in active_shots), pack_queue(enemy_appearance), len(enemy_appearance))
+
+	def to_round(self):
+		# unpack into (ships, active_ship, active_enemy, active_shots, enemy_appearance) as used by update_state
+		num_ships = self.rules[0]
+		ships = ["inactive" if self.inactive >> i & 1 else "wracked" if self.wracked >> i & 1 else "active" for i in range(num_ships)]
+		active_ship = {"pos": self.pos, "lifetime": self.lifetime, "base": self.base, "shots": self.shots_left} if self.pos >= 0 else {}
+		active_enemy = {"pos_x": self.enemy_x, "pos_y": self.enemy_y} if self.enemy_x >= 0 else {}
+		active_shots = []
+		for shot in self.shots:
+			pos_x, pos_y = unpack_shot(shot, self.shift)
+			active_shots.append({"pos_x": pos_x, "pos_y": pos_y})
+		return ships, active_ship, active_enemy, active_shots, list(self.queue[:self.remaining])
+
+	def key(self):
+		return (self.inactive, self.wracked, self.pos, self.base, self.lifetime, self.shots_left, self.enemy_x, self.enemy_y, self.shots, self.remaining)
+
+	def __hash__(self):
+		if self._hash is None:
+			self._hash = hash(self.key())
+		return self._hash
+
+	def __eq__(self, other):
+		return isinstance(other, GameState) and self.key() == other.key() and (self.queue is other.queue or self.queue[:self.remaining] == other.queue[:other.remaining])
+
+	def __copy__(self):
+		return self
+
+	def copy(self):
+		return self
+
+	def legal_actions(self):
+		# the actions process_input would accept as next action
+		num_ships = self.rules[0]
+		if self.pos < 0:
+			return [activate(i) for i in range(num_ships) if self.inactive >> i & 1]
+		actions = []
+		if self.pos > 0:
+			actions.append(("move", "left", "move <"))
+		if self.pos < num_ships - 1:
+			actions.append(("move", "right", "move >"))
+		if self.shots_left > 0:
+			actions.append(("shoot", "", "fire *"))
+		return actions
+
+	def step(self, action=()):
+		# the rules of update_state, returns the next state or True if the round is won or False if it is lost
+		num_ships, sky_height, num_missiles = self.rules
+		shift = self.shift
+		inactive = self.inactive
+		wracked = self.wracked
+		pos = self.pos
+		base = self.base
+		lifetime = self.lifetime
+		shots_left = self.shots_left
+		enemy_x = self.enemy_x
+		enemy_y = self.enemy_y
+		shots = self.shots
+		remaining = self.remaining
+		if action:
+			if action[0] == "activate":
+				value = action[1] if action[1] >= 0 else num_ships - 1
+				inactive &= ~(1 << value)
+				pos = value
+				base = value
+				lifetime = (num_ships*num_missiles)//2
+				shots_left = num_missiles
+			elif action[0] == "move":
+				pos += -1 if action[1] == "left" else 1
+				lifetime -= 1
+			else:
+				shots += (pack_shot(pos, sky_height, shift),)
+				shots_left -= 1
+		# check ship lifetime
+		if pos >= 0:
+			if lifetime <= 0 and shots_left > 0:
+				return False
+			if shots_left <= 0:
+				wracked |= 1 << base
+				pos = base = -1
+				lifetime = 0
+		# move shots
+		if shots:
+			moved = []
+			mask = (1 << shift) - 1
+			for shot in shots:
+				pos_x = shot >> shift
+				pos_y = (shot & mask) - 1
+				if enemy_x >= 0 and pos_x == enemy_x and (pos_y == enemy_y or pos_y - 1 == enemy_y):
+					enemy_x = -1
+					enemy_y = 0
+					continue
+				if pos_y < 0:
+					return False
+				moved.append(shot - 1)
+			shots = tuple(moved)
+		# move enemy
+		if enemy_x >= 0:
+			enemy_y += 1
+			if enemy_y >= sky_height:
+				return False
+		elif remaining:
+			remaining -= 1
+			enemy_x = self.queue[remaining]
+			enemy_y = 0
+		else:
+			return True
+		return GameState(self.rules, shift, inactive, wracked, pos, base, lifetime, shots_left, enemy_x, enemy_y, shots, self.queue, remaining)
@@ -0,0 +1,185 @@
+##
+ # Let bots play Alien Shower against each other over many seeds and configurations.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import os
+import time
+import random
+import argparse
+import importlib
+import concurrent.futures
+
+import alien_shower
+import alien_solver
+
+class Bot:
+	"""A policy: reset() is called at the start of each round, act() once per game step and returns the next action."""
+
+	def __init__(self, seed=None):
+		self.rng = random.Random(seed)
+
+	def reset(self, engine):
+		pass
+
+	def act(self, engine):
+		return ()
+
+class RandomBot(Bot):
+	"""Picks any legal action or waits."""
+
+	def act(self, engine):
+		return self.rng.choice(engine.legal_actions() + [()])
+
+class GreedyBot(Bot):
+	"""Wakes the ship closest to the next alien, moves below it and shoots once it is on screen."""
+
+	def act(self, engine):
+		ship = engine.active_ship
+		enemy = engine.active_enemy
+		# the alien on screen if no shot is on its way to it, else the next one to come
+		if enemy and not any(shot["pos_x"] == enemy["pos_x"] and shot["pos_y"] >= enemy["pos_y"] for shot in engine.active_shots):
+			goal = enemy["pos_x"]
+		elif engine.enemy_appearance:
+			goal = engine.enemy_appearance[-1]
+			enemy = {}
+		else:
+			return ()
+		if not ship:
+			bases = [base for base, state in enumerate(engine.ships) if state == "inactive"]
+			return alien_solver.activate(min(bases, key=lambda base: abs(base - goal))) if bases else ()
+		if ship["pos"] > goal:
+			return alien_solver.LEFT
+		if ship["pos"] < goal:
+			return alien_solver.RIGHT
+		if enemy and ship["shots"] > 0:
+			return alien_solver.SHOOT
+		return ()
+
+class SolverBot(Bot):
+	"""Follows a winning plan of the solver, plays greedy in rounds that cannot be won.
+
+	The plan is looked up by the state of each step (and planned again from states off the plan), so a live bot
+	stays on it after ticks it missed.
+	"""
+
+	def reset(self, engine):
+		self.planner = alien_solver.Planner(engine.num_ships, engine.sky_height, engine.num_missiles)
+
+	def act(self, engine):
+		return self.planner.suggest(engine.state(), None)
+
+BOTS = {
+	"random": RandomBot,
+	"greedy": GreedyBot,
+	"solver": SolverBot,
+}
+
+def load_bot(name):
+	# a bot is one of BOTS or given as module:class
+	if name in BOTS:
+		return BOTS[name]
+	module, _, attribute = name.partition(":")
+	if not attribute:
+		raise ValueError(f"unknown bot {name} (choose from {', '.join(BOTS)} or give module:class)")
+	return getattr(importlib.import_module(module), attribute)
+
+def new_result():
+	result = {"rounds": 0, "wins": 0, "losses": 0, "steps": 0}
+	result.update({key: [0, 0] for key in alien_shower.new_final_stats()})
+	return result
+
+def add_result(total, result):
+	for key, value in result.items():
+		if isinstance(value, list):
+			total[key][0] += value[0]
+			total[key][1] += value[1]
+		else:
+			total[key] += value
+
+def play(bot_name, config, seeds):
+	# play one round per seed, runs in a worker process
+	num_ships, sky_height, num_missiles = config
+	result = new_result()
+	for seed in seeds:
+		bot = load_bot(bot_name)(seed)
+		engine = alien_shower.GameEngine(num_ships, sky_height, num_missiles, seed=seed)
+		bot.reset(engine)
+		while not engine.done:
+			engine.step(bot.act(engine))
+			result["steps"] += 1
+		result["rounds"] += 1
+		result["wins" if engine.won else "losses"] += 1
+		add_result(result, engine.final_stats)
+	return result
+
+def ratio(value):
+	return value[0] / value[1] if value[1] else 0
+
+def ranking(totals):
+	# best win rate first, then most aliens destroyed and fewest missed shots
+	return sorted(totals.items(), key=lambda item: (-item[1]["wins"] / max(1, item[1]["rounds"]), -ratio(item[1]["aliens destroyed"]), ratio(item[1]["missed shots"])))
+
+def report(totals):
+	print(f"{'rank':>4}  {'bot':20} {'config':10} {'rounds':>7} {'win rate':>9} {'destroyed':>10} {'missed shots':>13} {'expired':>8}")
+	for rank, ((bot, config), total) in enumerate(ranking(totals), 1):
+		config = "x".join(str(value) for value in config)
+		print(f"{rank:4}  {bot:20} {config:10} {total['rounds']:7} {total['wins'] / max(1, total['rounds']):9.1%} "
+			f"{ratio(total['aliens destroyed']):10.1%} {ratio(total['missed shots']):13.1%} {ratio(total['ships lifetime expired']):8.1%}")
+
+def tournament(bots, configs, seeds, workers=None, chunk_size=50, progress=None):
+	# spread the rounds over a process pool, progress is called with (bot, config, total) whenever a chunk is done
+	totals = {(bot, config): new_result() for bot in bots for config in configs}
+	with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+		futures = {}
+		for start in range(0, len(seeds), chunk_size):
+			for key in totals:
+				futures[pool.submit(play, *key, seeds[start:start + chunk_size])] = key
+		for future in concurrent.futures.as_completed(futures):
+			key = futures[future]
+			add_result(totals[key], future.result())
+			if progress:
+				progress(*key, totals[key])
+	return totals
+
+def main():
+	parser = argparse.ArgumentParser(description="Let bots play Alien Shower over many seeds and rank them.")
+	parser.add_argument("--bots", nargs="+", default=list(BOTS), metavar="BOT", help=f"the bots to play, one of {', '.join(BOTS)} or module:class (default: all)")
+	parser.add_argument("--ships", type=int, nargs="+", default=[5], help="the numbers of ships to play with")
+	parser.add_argument("--sky", type=int, nargs="+", default=[4], help="the sky heights to play with")
+	parser.add_argument("--missiles", type=int, nargs="+", default=[2], help="the numbers of missiles to play with")
+	parser.add_argument("--rounds", type=int, default=1000, help="the number of rounds (seeds) per bot and configuration")
+	parser.add_argument("--seed", type=int, default=0, help="the first seed")
+	parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of worker processes (default: all cores)")
+	parser.add_argument("--chunk", type=int, default=50, help="the number of rounds per task")
+	args = parser.parse_args()
+	for bot in args.bots:
+		load_bot(bot)
+	configs = [(num_ships, sky_height, num_missiles) for num_ships in args.ships for sky_height in args.sky for num_missiles in args.missiles]
+	seeds = list(range(args.seed, args.seed + args.rounds))
+	start = time.perf_counter()
+
+	def progress(bot, config, total):
+		config = "x".join(str(value) for value in config)
+		print(f"{time.perf_counter() - start:7.1f}s  {bot:20} {config:10} {total['rounds']:7} rounds  {total['wins'] / max(1, total['rounds']):6.1%} won", flush=True)
+
+	totals = tournament(args.bots, configs, seeds, args.workers, args.chunk, progress)
+	print()
+	report(totals)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,186 @@
+##
+ # Wave mode of Alien Shower: many aliens on screen at once, found by shots through a spatial hash.
+ #
+ # Copyright (C) 2018  Annemarie Mattmann
+ #
+ # This program is free software: you can redistribute it and/or modify
+ # it under the terms of the GNU General Public License as published by
+ # the Free Software Foundation, either version 3 of the License, or
+ # (at your option) any later version.
+ #
+ # This program is distributed in the hope that it will be useful,
+ # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ # GNU General Public License for more details.
+ #
+ # You should have received a copy of the GNU General Public License
+ # along with this program.  If not, see <https://www.gnu.org/licenses/>.
+##
+
+import time
+import random
+import argparse
+import collections
+
+import alien_shower
+
+class Wave:
+	"""The aliens on screen, hashed by column and the step they appeared at.
+
+	All aliens fall one row per step, so the row of an alien is the number of steps since it appeared. Its key
+	never changes while it falls, the aliens do not have to be moved one by one and a shot finds the alien in a
+	cell with a single lookup. The lowest alien is always the oldest one.
+	"""
+	__slots__ = ("interval", "step", "since", "cells", "order")
+
+	def __init__(self, interval=None):
+		# a new alien appears every interval steps or once the sky is clear (only the latter if None, as in update_state)
+		self.interval = interval
+		self.step = 0
+		self.since = 0
+		# (column, step appeared at) of the aliens on screen
+		self.cells = set()
+		# (step appeared at, column) from the oldest, destroyed aliens are dropped once they are the oldest
+		self.order = collections.deque()
+
+	def __len__(self):
+		return len(self.cells)
+
+	def spawn(self, pos_x):
+		# the aliens only fall while there are any, so forget the destroyed ones to not mistake them for a new one
+		if not self.cells:
+			self.order.clear()
+		self.cells.add((pos_x, self.step))
+		self.order.append((self.step, pos_x))
+		self.since = 0
+
+	def advance(self):
+		# all aliens fall one row
+		self.step += 1
+		self.since += 1
+
+	def hit(self, pos_x, pos_y):
+		# destroy the alien in the cell if there is one
+		key = (pos_x, self.step - pos_y)
+		if key in self.cells:
+			self.cells.remove(key)
+			return True
+		return False
+
+	def lowest(self):
+		# the alien closest to the ground as dict like active_enemy (empty if there is none)
+		order = self.order
+		while order and (order[0][1], order[0][0]) not in self.cells:
+			order.popleft()
+		return {"pos_x": order[0][1], "pos_y": self.step - order[0][0]} if order else {}
+
+	def enemies(self):
+		# all aliens on screen from the lowest
+		return [{"pos_x": pos_x, "pos_y": self.step - appeared} for appeared, pos_x in self.order if (pos_x, appeared) in self.cells]
+
+def update_wave(active_ship, wave, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, next_action, final_stats, feedback):
+	# the rules of update_state with the aliens of a wave instead of the active enemy, the cost of a step only
+	# depends on the shots in flight and the aliens appearing, not on the aliens on screen
+
+	done, feedback = alien_shower.update_ship(active_ship, active_shots, ships, sky_height, num_missiles, stats, next_action, final_stats, feedback)
+	if done:
+		return True, feedback
+
+	### update game state ###
+
+	# move shots, a shot hits the alien in its cell or the one right above it (which it would pass otherwise)
+	i = 0
+	while i < len(active_shots):
+		shot = active_shots[i]
+		# handle hit
+		if wave.hit(shot["pos_x"], shot["pos_y"]) or wave.hit(shot["pos_x"], shot["pos_y"] - 1):
+			del active_shots[i]
+			stats["destroyed"] += 1
+			feedback = "alien destroyed     " + "\n" + " " * 20
+			final_stats["aliens destroyed"][0] += 1
+			continue
+		# handle world-border reached, loose the game
+		elif shot["pos_y"] < 0:
+			stats["losses"] += 1
+			final_stats["missed shots"][0] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "missed shot          \nhit return to retry "
+		# handle move
+		else:
+			shot["pos_y"] -= 1
+		i += 1
+	# move aliens
+	if wave:
+		wave.advance()
+		# loose the game
+		if wave.lowest()["pos_y"] >= sky_height:
+			stats["losses"] += 1
+			final_stats["missed defence"][0] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "missing defence      \nhit return to retry "
+	# set new alien if in store once the sky is clear or the interval passed
+	if not wave or wave.interval and wave.since >= wave.interval:
+		if enemy_appearance:
+			wave.spawn(enemy_appearance.pop())
+			final_stats["aliens destroyed"][1] += 1
+		# win the game
+		elif not wave:
+			stats["wins"] += 1
+			final_stats["missed defence"][1] += 1
+			return True, "all aliens destroyed\nhit return for more "
+	return False, feedback
+
+def naive_hits(active_shots, enemies):
+	# the hits a direct extension of update_state finds by comparing every shot with every alien
+	hits = 0
+	for shot in active_shots:
+		for enemy in enemies:
+			if shot["pos_x"] == enemy["pos_x"] and (shot["pos_y"] == enemy["pos_y"] or shot["pos_y"] - 1 == enemy["pos_y"]):
+				hits += 1
+				break
+	return hits
+
+def benchmark(num_aliens, steps, num_ships=10, seed=0):
+	# time the steps of a wave with about num_aliens aliens and as many shots in flight (in a sky too high for any
+	# to land or leave), and comparing every shot with every alien on the same positions
+	rng = random.Random(seed)
+	sky_height = 2 * (num_aliens + steps) + 2
+	num_missiles = 2 * (num_aliens + steps)
+	ships, enemy_appearance = alien_shower.init_fleet(num_ships, num_missiles, rng)
+	wave = Wave(1)
+	active_ship = {}
+	active_shots = []
+	stats = {"wins": 0, "losses": 0, "destroyed": 0}
+	final_stats = alien_shower.new_final_stats()
+	feedback = ""
+	wave_time = naive_time = 0
+	for step in range(num_aliens + steps):
+		if not active_ship:
+			action = ("activate", ships.index("inactive"), "")
+		else:
+			action = rng.choice([("shoot", "", "fire *"), ("move", "left" if active_ship["pos"] else "right", "")])
+			active_ship["lifetime"] = num_missiles
+		if step < num_aliens:
+			update_wave(active_ship, wave, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+			continue
+		enemies = wave.enemies()
+		start = time.perf_counter()
+		naive_hits(active_shots, enemies)
+		naive_time += time.perf_counter() - start
+		start = time.perf_counter()
+		update_wave(active_ship, wave, active_shots, ships, enemy_appearance, sky_height, num_missiles, stats, action, final_stats, feedback)
+		wave_time += time.perf_counter() - start
+	return len(wave), len(active_shots), wave_time / steps, naive_time / steps
+
+def main():
+	parser = argparse.ArgumentParser(description="Time the steps of the wave mode against comparing every shot with every alien.")
+	parser.add_argument("--aliens", type=int, nargs="+", default=[10, 100, 1000, 10000], help="the numbers of aliens on screen to time")
+	parser.add_argument("--steps", type=int, default=1000, help="the steps to time per number of aliens")
+	args = parser.parse_args()
+	print(f"{'aliens':>7} {'shots':>6} {'wave step':>10} {'all pairs':>10}")
+	for num_aliens in args.aliens:
+		aliens, shots, wave_time, naive_time = benchmark(num_aliens, args.steps)
+		print(f"{aliens:7} {shots:6} {wave_time * 1e6:8.1f}us {naive_time * 1e6:8.1f}us")
+
+if __name__ == "__main__":
+	main()
@@ -8,10 +8,11 @@ setuptools.setup(
 	author="Kjili",
 	author_email="Kjili@users.noreply.github.com",
 	url="https://github.com/Kjili/AlienShower",
-	py_modules=["alien_shower"],
+	py_modules=["alien_shower", "alien_solver", "alien_state", "alien_tournament", "alien_server", "alien_batch", "alien_calibrate", "alien_broadcast", "alien_render", "alien_wave", "alien_bot", "alien_sim", "alien_bench", "alien_check"],
 	# requirements
 	setup_requires=["setuptools_scm",],
-	python_requires=">=3.6",
+	extras_require={"batch": ["numpy"]},
+	python_requires=">=3.7",
 	# further description
 	keywords="game",
 	classifiers=[
@@ -22,7 +23,7 @@ setuptools.setup(
 		"Natural Language :: English",
 		"Operating System :: Unix",
 		"Programming Language :: Python :: 3",
-		"Programming Language :: Python :: 3.6",
+		"Programming Language :: Python :: 3.7",
 		"Topic :: Games/Entertainment",
 		"Topic :: Games/Entertainment :: Arcade",
 		"Topic :: Games/Entertainment :: Puzzle Games"